@@ -1,15 +1,30 @@
 import asyncio
+import collections
+import concurrent.futures
+import functools
+import threading
 import usb1
 from select import POLLIN, POLLOUT
-from weakref import finalize
+import time
+from weakref import finalize, ref
 from . import descriptor
+from . import metrics as metrics_
+from . import snapshot
 
-__all__ = ["Context"]
+__all__ = ["Context", "HotplugEvent"]
 
 class ContextNotifier:
     """
     Object used for binding libusb1 into Asyncio's event loop.
     This is an implementation detail (i.e. no API stability).
+
+    libusb events are handled directly from FD readiness callbacks,
+    without blocking. libusb internal timeouts, if any, are tracked
+    with a single timer handle on the loop.
+
+    Blocking libusb calls run on context executor may also handle
+    events or change FDs from a worker thread. Such notifications and
+    completions are bounced to the loop.
     """
     def __init__(self, loop, context):
         """
@@ -17,34 +32,56 @@ class ContextNotifier:
         :param context: usb1 context
         """
         self.loop = loop
-        self.fd_ready = asyncio.Event()
-        self.done = asyncio.Event()
+        self.thread = threading.get_ident()
         self.readers = set()
         self.writers = set()
         self.context = context
+        self.timer = None
+        self.closed = False
 
         self.context.setPollFDNotifiers(self._fd_register, self._fd_unregister, self)
+        for fd, events in self.context.getPollFDList():
+            self._fd_register(fd, events, self)
 
-        waiter = asyncio.shield(self._work())
+        self.timeout_update()
 
     def close(self):
         """
         Stop watching all FDs and stop calling context.
         """
+        if self.closed:
+            return
+        self.closed = True
         self.context.setPollFDNotifiers()
-        self.done.set()
+        for fd in self.writers:
+            self.loop.remove_writer(fd)
+        for fd in self.readers:
+            self.loop.remove_reader(fd)
+        self.writers.clear()
+        self.readers.clear()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
 
     @staticmethod
     def _fd_register(fd, events, self):
+        if threading.get_ident() != self.thread:
+            self.loop.call_soon_threadsafe(self._fd_register, fd, events, self)
+            return
+        if self.closed:
+            return
         if events & POLLIN:
             self.readers.add(fd)
-            self.loop.add_reader(fd, self.fd_ready.set)
+            self.loop.add_reader(fd, self._handle)
         if events & POLLOUT:
             self.writers.add(fd)
-            self.loop.add_writer(fd, self.fd_ready.set)
+            self.loop.add_writer(fd, self._handle)
 
     @staticmethod
     def _fd_unregister(fd, self):
+        if threading.get_ident() != self.thread:
+            self.loop.call_soon_threadsafe(self._fd_unregister, fd, self)
+            return
         if fd in self.readers:
             self.readers.remove(fd)
             self.loop.remove_reader(fd)
@@ -52,50 +89,443 @@ class ContextNotifier:
             self.writers.remove(fd)
             self.loop.remove_writer(fd)
 
-    async def _work(self):
+    def _handle(self):
+        """
+        Handle pending libusb events without blocking.
+        """
+        if self.closed:
+            return
+        self.context.handleEventsTimeout(0)
+        self.timeout_update()
+
+    def _on_timer(self):
+        self.timer = None
+        self._handle()
+
+    def completion_callback(self, callback):
+        """
+        Get callback to pass to libusb for calling back `callback` on
+        loop. Events are normally handled on loop, callback is then
+        called directly.
+        """
+        def on_event(*args):
+            if threading.get_ident() == self.thread:
+                callback(*args)
+            else:
+                self.loop.call_soon_threadsafe(callback, *args)
+        return on_event
+
+    def timeout_update(self):
+        """
+        Schedule timer for next libusb internal timeout. This must be
+        called after submitting a transfer with a timeout, libusb may
+        not tell about it through its FDs.
+        """
+        if self.closed:
+            return
+        timeout = self.context.getNextTimeout()
+        timer = self.timer
+
+        if timeout is None:
+            if timer is not None:
+                timer.cancel()
+                self.timer = None
+            return
+
+        when = self.loop.time() + timeout
+        if timer is not None:
+            if timer.when() <= when:
+                return
+            timer.cancel()
+        self.timer = self.loop.call_at(when, self._on_timer)
+
+class ContextThread:
+    """
+    Object handling libusb1 events on a dedicated thread, alternative
+    to ContextNotifier. This is an implementation detail (i.e. no API
+    stability).
+
+    libusb calls back completions on event thread. They are queued
+    and dispatched on loop in batches, a single loop wakeup carries
+    all completions queued since last dispatch.
+    """
+    def __init__(self, loop, context):
+        """
+        :param loop: Event loop
+        :param context: usb1 context
+        """
+        self.loop = loop
+        self.context = context
+        self.closed = False
+        self.pending = []
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target = self._work,
+                                       name = "ausb-events",
+                                       daemon = True)
+        self.thread.start()
+
+    def close(self):
+        """
+        Stop event thread.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.context.interruptEventHandler()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _work(self):
+        while not self.closed:
+            try:
+                self.context.handleEvents()
+            except usb1.USBErrorInterrupted:
+                pass
+
+    def timeout_update(self):
+        """
+        libusb timeouts are handled by event thread, nothing to do.
+        """
+        pass
+
+    def completion_callback(self, callback):
+        """
+        Get callback to pass to libusb for calling back `callback` on
+        loop.
+        """
+        return functools.partial(self._complete, callback)
+
+    def _complete(self, callback, *args):
+        """
+        Called on event thread, queue completion for loop.
+        """
+        with self.lock:
+            self.pending.append((callback, args))
+            wakeup = len(self.pending) == 1
+        if wakeup:
+            try:
+                self.loop.call_soon_threadsafe(self._dispatch)
+            except RuntimeError:
+                # Loop is closed
+                pass
+
+    def _dispatch(self):
+        """
+        Called on loop, run all queued completions.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for callback, args in pending:
+            try:
+                callback(*args)
+            except Exception as e:
+                self.loop.call_exception_handler({
+                    "message": "Exception in USB completion callback",
+                    "exception": e,
+                })
+
+class HotplugEvent:
+    """
+    Device arrival or departure, as yielded by Hotplug.
+    """
+    ARRIVED = "arrived"
+    LEFT = "left"
+
+    def __init__(self, event, device):
+        """
+        :param event: Either HotplugEvent.ARRIVED or HotplugEvent.LEFT
+        :param device: descriptor.Device
+        """
+        self.event = event
+        self.device = device
+
+    def __repr__(self):
+        return "<HotplugEvent %s %s>" % (self.event, self.device)
+
+class Hotplug:
+    """
+    Hotplug event stream, should be spawned by Context.hotplug().
+
+    Stream is an asynchronous iterator over HotplugEvent objects, and
+    an asynchronous context manager unsubscribing on exit.
+    """
+    def __init__(self, context, vendor_id, product_id, device_class, callback):
+        self.context = context
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.device_class = device_class
+        self.callback = callback
+        self.__events = collections.deque()
+        self.__waiter = None
+        self.__closed = False
+
+    def _match(self, device):
+        d = device.device
+        return (self.vendor_id is None or d.getVendorID() == self.vendor_id) \
+            and (self.product_id is None or d.getProductID() == self.product_id) \
+            and (self.device_class is None or d.getDeviceClass() == self.device_class)
+
+    def _push(self, event):
+        if self.__closed or not self._match(event.device):
+            return
+        if self.callback is not None:
+            self.callback(event)
+            return
+        self.__events.append(event)
+        waiter = self.__waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self):
+        """
+        Wait for next event. Raises ValueError if stream is closed.
+        """
+        while not self.__events:
+            if self.__closed:
+                raise ValueError("Hotplug stream closed")
+            self.__waiter = self.context.loop.create_future()
+            try:
+                await self.__waiter
+            finally:
+                self.__waiter = None
+        return self.__events.popleft()
+
+    def close(self):
+        """
+        Unsubscribe from context events.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        self.context._hotplug_unsubscribe(self)
+        waiter = self.__waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.__closed and not self.__events:
+            raise StopAsyncIteration
         try:
-            while not self.done.is_set():
-                try:
-                    self.fd_ready.clear()
-                    await asyncio.wait_for(
-                        self.fd_ready.wait(),
-                        timeout = self.context.getNextTimeout())
-                except asyncio.TimeoutError:
-                    pass
-                except asyncio.CancelledError:
-                    continue
-                self.context.handleEventsTimeout()
-        finally:
-            for fd in self.writers:
-                self.loop.remove_writer(fd)
-            for fd in self.readers:
-                self.loop.remove_reader(fd)
+            return await self.get()
+        except ValueError:
+            raise StopAsyncIteration
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
 
 class Context:
     """
     AUsb main context.
     """
-    def __init__(self, loop = None, ignore_access_errors = True):
+
+    SNAPSHOT_MAX_AGE = 1.0
+    HOTPLUG_POLL_INTERVAL = 1.0
+    BLOCKING_WORKERS = 4
+
+    def __init__(self, loop = None, ignore_access_errors = True, event_thread = False,
+                 metrics = False, backend = None):
         """
         Setup a context wrapping libusb1's context. Binds usb1 to
         asyncio's event loop immediately.
+
+        :param event_thread: Handle libusb events on a dedicated thread
+          instead of on event loop, completions are then dispatched to
+          loop in batches. This keeps USB latency stable when loop is
+          busy.
+        :param metrics: Record transfer metrics for devices opened
+          afterwards, see metrics.Metrics. May be a callable, it is
+          then registered as a metrics hook.
+        :param backend: Factory for the underlying libusb context,
+          defaults to usb1.USBContext. Alternatives must provide the
+          usb1 API subset ausb uses, see sim.Host.USBContext.
         """
-        self.context = usb1.USBContext()
+        self.context = (backend or usb1.USBContext)()
         self.loop = loop or asyncio.get_running_loop()
         self.ignore_access_errors = ignore_access_errors
-        self.notifier = ContextNotifier(self.loop, self.context)
-        finalize(self, self.notifier.close)
+        self.generation = 0
+        self.__snapshot = None
+        self.__index = snapshot.Index()
+        self.__hotplug_subscribers = []
+        self.__hotplug_poller = None
+        self.__executor = None
+        self.metrics = None
+        if metrics:
+            self.metrics = metrics_.Metrics(metrics if callable(metrics) else None)
+        if event_thread:
+            self.notifier = ContextThread(self.loop, self.context)
+        else:
+            self.notifier = ContextNotifier(self.loop, self.context)
+        # Finalizers run last registered first, notifier must stop
+        # using context before it gets closed.
         finalize(self, self.context.close)
+        finalize(self, self.notifier.close)
+
+        self.__hotplug_handle = None
+        if self.context.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            self_ref = ref(self)
+            def on_hotplug(device, event):
+                self = self_ref()
+                if self is not None:
+                    self._on_hotplug(device, event)
+            dispatch = self.notifier.completion_callback(on_hotplug)
+            self.__hotplug_handle = self.context.hotplugRegisterCallback(
+                lambda context, device, event: dispatch(device, event),
+                flags = 0)
+
+    def _on_hotplug(self, device, event):
+        """
+        Internal method called on libusb hotplug events. Subscribers are
+        called back later, outside of libusb event handling.
+        """
+        self.invalidate()
+        if event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED:
+            event = HotplugEvent.ARRIVED
+        else:
+            event = HotplugEvent.LEFT
+        self.loop.call_soon(self._hotplug_push,
+                            HotplugEvent(event, descriptor.Device(self, device)))
+
+    def _hotplug_push(self, event):
+        for subscriber in list(self.__hotplug_subscribers):
+            try:
+                subscriber._push(event)
+            except Exception as e:
+                self.loop.call_exception_handler({
+                    "message": "Exception in hotplug callback",
+                    "exception": e,
+                })
+
+    def hotplug(self, vendor_id = None, product_id = None, device_class = None,
+                enumerate = False, callback = None):
+        """
+        Subscribe to device arrival and departure events.
+
+        libusb hotplug support is used where available. Elsewhere,
+        devices are enumerated every HOTPLUG_POLL_INTERVAL seconds and
+        compared to previous enumeration.
+
+        :param vendor_id: Only report devices with this vendor ID
+        :param product_id: Only report devices with this product ID
+        :param device_class: Only report devices with this device class
+        :param enumerate: Report devices already present as arrived
+        :param callback: Function called with each HotplugEvent, instead
+          of queueing events for iteration
+        :returns: A Hotplug instance
+        """
+        subscriber = Hotplug(self, vendor_id, product_id, device_class, callback)
+
+        if enumerate:
+            for d in self.snapshot():
+                subscriber._push(HotplugEvent(HotplugEvent.ARRIVED, d.descriptor))
+        else:
+            self.snapshot()
+
+        self.__hotplug_subscribers.append(subscriber)
+
+        if self.__hotplug_handle is None and self.__hotplug_poller is None:
+            self.__hotplug_poller = self.loop.create_task(self._hotplug_poll())
+
+        return subscriber
+
+    def _hotplug_unsubscribe(self, subscriber):
+        self.__hotplug_subscribers.remove(subscriber)
+        if not self.__hotplug_subscribers and self.__hotplug_poller is not None:
+            self.__hotplug_poller.cancel()
+            self.__hotplug_poller = None
+
+    async def _hotplug_poll(self):
+        while True:
+            await asyncio.sleep(self.HOTPLUG_POLL_INTERVAL)
+            self.invalidate()
+            self.snapshot()
+
+    def invalidate(self):
+        """
+        Tell context devices changed, next lookup takes a new snapshot.
+        """
+        self.generation += 1
+        self.__snapshot = None
+
+    def snapshot(self):
+        """
+        Get a snapshot of all devices descriptor trees. Snapshot is
+        cached and shared until context generation changes. Without
+        libusb hotplug support, snapshot also expires after
+        SNAPSHOT_MAX_AGE seconds.
+        """
+        s = self.__snapshot
+        if s is not None and s.generation == self.generation \
+           and (self.__hotplug_handle is not None
+                or time.monotonic() - s.timestamp < self.SNAPSHOT_MAX_AGE):
+            return s
+
+        polled = self.__hotplug_handle is None and self.__hotplug_subscribers
+        if polled:
+            before = dict(self.__index.devices)
+
+        devices = self.__index.update(self._descriptors())
+        s = snapshot.Snapshot(self.generation, devices)
+        self.__snapshot = s
+
+        if polled:
+            after = self.__index.devices
+            for key, d in before.items():
+                if key not in after:
+                    self._hotplug_push(HotplugEvent(HotplugEvent.LEFT, d.descriptor))
+            for key, d in after.items():
+                if key not in before:
+                    self._hotplug_push(HotplugEvent(HotplugEvent.ARRIVED, d.descriptor))
+
+        return s
+
+    async def _blocking(self, func, *args):
+        """
+        Run a blocking libusb call off event loop, on context executor.
+        At most BLOCKING_WORKERS calls run concurrently, others wait.
+        """
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(
+                self.BLOCKING_WORKERS, thread_name_prefix = "ausb")
+            finalize(self, self.__executor.shutdown, False)
+        return await self.loop.run_in_executor(self.__executor, functools.partial(func, *args))
+
+    def _strings(self, device):
+        """
+        Get string descriptor cache for an usb1 device. Cache lives as
+        long as device stays in context index, i.e. until it leaves or
+        gets re-enumerated.
+        """
+        d = self.__index.devices.get(snapshot.device_key(device))
+        return {} if d is None else d.strings
+
+    def _descriptors(self):
+        for d in self.context.getDeviceIterator(skip_on_error = self.ignore_access_errors):
+            yield descriptor.Device(self, d)
 
     def device_filter(self, **criteria):
         """
         Iterate through device descriptors matching all the criteria.
         Criteria are matched against device descriptor attributes.
+        Lookups by bus and ports, by vendor_id and product_id or by
+        serial use an index.
         """
-        for d in self.context.getDeviceIterator(skip_on_error = self.ignore_access_errors):
-            d = descriptor.Device(self, d)
-            if all(criteria[k] == getattr(d, k) for k in criteria.keys()):
-                yield d
+        s = self.snapshot()
+        indexed = self.__index.candidates(criteria)
+        if indexed is None:
+            devices = s
+        else:
+            devices, matched = indexed
+            criteria = {k: v for k, v in criteria.items() if k not in matched}
+
+        for d in devices:
+            if d.match(criteria):
+                yield d.descriptor
 
     def device_get_any(self, **criteria):
         """
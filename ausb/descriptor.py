@@ -95,7 +95,7 @@ class Device:
         """
         Device protocol
         """
-        return self.device.getProtocol()
+        return self.device.getDeviceProtocol()
 
     @property
     def max_packet_size0(self):
@@ -133,21 +133,114 @@ class Device:
         """
         Device manufacturer string from descriptor
         """
-        return self.device.getManufacturer()
+        return self._string(self.manufacturer_index)
+
+    @property
+    def manufacturer_index(self):
+        """
+        Device manufacturer string index
+        """
+        return self.device.getManufacturerDescriptor()
 
     @property
     def product(self):
         """
         Device product string from descriptor
         """
-        return self.device.getProduct()
+        return self._string(self.product_index)
+
+    @property
+    def product_index(self):
+        """
+        Device product string index
+        """
+        return self.device.getProductDescriptor()
 
     @property
     def serial(self):
         """
         Device serial number string from descriptor
         """
-        return self.device.getSerialNumber()
+        return self._string(self.serial_index)
+
+    @property
+    def serial_index(self):
+        """
+        Device serial number string index
+        """
+        return self.device.getSerialNumberDescriptor()
+
+    @property
+    def string_indexes(self):
+        """
+        Sorted list of string indexes referenced by device,
+        configuration and interface descriptors
+        """
+        indexes = {self.manufacturer_index, self.product_index, self.serial_index}
+        for configuration in self.device.iterConfigurations():
+            indexes.add(configuration.getDescriptor())
+            for interface in configuration:
+                for setting in interface:
+                    indexes.add(setting.getDescriptor())
+        indexes.discard(0)
+        return sorted(indexes)
+
+    def _string(self, index, handle = None):
+        """
+        Get a string descriptor in device's first language, through
+        context string cache. Uses blocking API on cache miss.
+
+        :param index: String index
+        :param handle: An opened usb1 handle to use, if any
+        """
+        if not index:
+            return None
+
+        cache = self.context._strings(self.device)
+        try:
+            return cache[(None, index)]
+        except KeyError:
+            pass
+
+        if handle is None:
+            handle = self.device.open()
+            try:
+                return self._string(index, handle)
+            finally:
+                handle.close()
+
+        languages = cache.get((None, 0))
+        if languages is None:
+            languages = cache[(None, 0)] = tuple(handle.getSupportedLanguageList())
+        if not languages:
+            return None
+
+        s = cache[(None, index)] = handle.getStringDescriptor(index, languages[0])
+        return s
+
+    async def strings_get(self, indexes = None, language = None):
+        """
+        Fetch string descriptors concurrently, through context string
+        cache. See handle.Device.strings_get(). Device is only opened
+        if some string is missing from cache.
+        """
+        cache = self.context._strings(self.device)
+        if indexes is None:
+            indexes = self.string_indexes
+        indexes = [i for i in indexes if i]
+
+        if language is None and cache.get((None, 0)) == ():
+            return {}
+        if (language is not None or (None, 0) in cache) \
+           and all((language, i) in cache for i in indexes):
+            return {i: cache[(language, i)] for i in indexes
+                    if cache[(language, i)] is not None}
+
+        handle = await self.open_async()
+        try:
+            return await handle.strings_get(indexes, language)
+        finally:
+            handle.close()
 
     @property
     def speed(self):
@@ -162,6 +255,13 @@ class Device:
         """
         from . import handle
         return handle.Device(self.context, self, self.device.open())
+
+    async def open_async(self):
+        """
+        Open device without blocking event loop, get a Device handle on it.
+        """
+        from . import handle
+        return handle.Device(self.context, self, await self.context._blocking(self.device.open))
     
 class Configuration:
     """
@@ -8,7 +8,14 @@ class Error(Exception):
 class TransferError(Error):
     pass
 class TransferTimeout(Error):
-    pass
+    """
+    Transfer timed out. length is the count of bytes transferred
+    before expiry, data the matching partial buffer, if any.
+    """
+    def __init__(self, length = 0, data = None):
+        Error.__init__(self, length)
+        self.length = length
+        self.data = data
 class TransferStalled(Error):
     pass
 class DeviceError(Error):
@@ -1,26 +1,139 @@
+import array
 import asyncio
+import collections
+import math
 import usb1
 from . import exception
+from . import snapshot
 from .constant import *
 
+class TransferPool:
+    """
+    Pool of reusable usb1 transfers for a device handle. This is an
+    implementation detail of Device (i.e. no API stability).
+
+    Transfers are released to the pool from their completion
+    callback. Free transfers are kept by setup key, so that a transfer
+    already set up for a given endpoint and size can be resubmitted
+    without touching its setup again.
+
+    Transfers set up on a caller-supplied buffer should use BORROWED as
+    key, their buffer is dropped when they come back to the pool.
+
+    usb1 cannot change the timeout of a transfer already set up, so
+    transfers with a timeout are not kept by key (None).
+    """
+    BORROWED = object()
+
+    def __init__(self, handle, size):
+        """
+        :param handle: usb1 device handle transfers are allocated from
+        :param size: Maximum count of free transfers kept around
+        """
+        self.handle = handle
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.__free = {}
+        self.__free_count = 0
+
+    def acquire(self, key = None):
+        """
+        Get a transfer from pool, allocate one if pool is empty.
+
+        :param key: Setup key the caller wants the transfer for, None if
+          caller always sets transfer up
+        :returns: a (transfer, ready) couple, where ready tells whether
+          transfer is already set up for key
+        """
+        free = self.__free.get(key)
+        if free:
+            transfer = free.pop()
+            if not free:
+                del self.__free[key]
+            self.__free_count -= 1
+            self.hits += 1
+            return transfer, key is not None
+
+        for other, free in self.__free.items():
+            transfer = free.pop()
+            if not free:
+                del self.__free[other]
+            self.__free_count -= 1
+            self.hits += 1
+            transfer.pool_key = None
+            return transfer, False
+
+        self.misses += 1
+        transfer = self.handle.getTransfer()
+        transfer.pool = self
+        transfer.pool_key = None
+        return transfer, False
+
+    def release(self, transfer):
+        """
+        Give back a transfer to the pool. Transfer must not be submitted.
+        """
+        if transfer.pool_key is self.BORROWED:
+            transfer.setBuffer(0)
+            transfer.pool_key = None
+        if self.__free_count >= self.size:
+            return
+        self.__free.setdefault(transfer.pool_key, []).append(transfer)
+        self.__free_count += 1
+
+    def clear(self):
+        """
+        Drop all free transfers.
+        """
+        self.__free.clear()
+        self.__free_count = 0
+
+    def __len__(self):
+        """
+        Count of free transfers in pool
+        """
+        return self.__free_count
+
 class Device:
     """
     Opened device handle. This object should be spawned by DeviceDescriptor.open().
     """
 
+    TRANSFER_POOL_SIZE = 32
+    CONTROL_BATCH_DEPTH = 8
+
     def __init__(self, context, descriptor, handle):
         self.context = context
         self.descriptor = descriptor
         self.handle = handle
+        self.transfer_pool = TransferPool(handle, self.TRANSFER_POOL_SIZE)
+        self.metrics = None
+        if context.metrics is not None:
+            self.metrics = context.metrics.device(snapshot.device_key(descriptor.device))
+        self._transfer_callback = self._completion_callback(self._on_transfer_done)
 
     def reopen(self):
         ports = self.descriptor.ports
         bus = self.descriptor.bus
         self.descriptor = None
         self.handle = None
+        self.transfer_pool.clear()
+        self.context.invalidate()
         next_desc = self.context.device_get(ports = ports, bus = bus)
         self.descriptor = next_desc
         self.handle = next_desc.device.open()
+        self.transfer_pool = TransferPool(self.handle, self.transfer_pool.size)
+        if self.metrics is not None:
+            self.metrics = self.context.metrics.device(snapshot.device_key(next_desc.device))
+            self._transfer_callback = self._completion_callback(self._on_transfer_done)
+
+    def close(self):
+        """
+        Close device handle, it must not be used afterwards.
+        """
+        self.transfer_pool.clear()
+        self.handle.close()
 
     @property
     def configuration(self):
@@ -33,26 +146,80 @@ class Device:
     def configuration(self, configuration):
         return self.handle.setConfiguration(configuration)
 
+    async def configuration_set_async(self, configuration):
+        """
+        Set current configuration without blocking event loop.
+        """
+        await self.context._blocking(self.handle.setConfiguration, configuration)
+
     @property
     def manufacturer(self):
         """
         Manufacturer string from descriptor
         """
-        return self.handle.getManufacturer()
+        return self.descriptor._string(self.descriptor.manufacturer_index, self.handle)
 
     @property
     def product(self):
         """
         Product string from descriptor
         """
-        return self.handle.getProduct()
+        return self.descriptor._string(self.descriptor.product_index, self.handle)
 
     @property
     def serial(self):
         """
         Device serial number string from descriptor
         """
-        return self.handle.getSerialNumber()
+        return self.descriptor._string(self.descriptor.serial_index, self.handle)
+
+    async def strings_get(self, indexes = None, language = None):
+        """
+        Fetch string descriptors concurrently. Strings are cached in
+        context for as long as device stays enumerated, only missing
+        ones are requested from device.
+
+        :param indexes: Iterable of string indexes, defaults to all
+          indexes referenced by device descriptors
+        :param language: Language ID, defaults to device's first language
+        :returns: A dict of index to string, strings device failed to
+          return are omitted. Stalled requests are not retried.
+        """
+        cache = self.context._strings(self.descriptor.device)
+        if indexes is None:
+            indexes = self.descriptor.string_indexes
+
+        lang_id = language
+        if lang_id is None:
+            languages = cache.get((None, 0))
+            if languages is None:
+                desc = await self.standard_control(Request.GetDescriptor,
+                                                   DescriptorType.String << 8, 0, 255)
+                length = min(desc[0], len(desc)) if len(desc) >= 2 else 0
+                languages = cache[(None, 0)] = tuple(
+                    int.from_bytes(desc[i : i + 2], "little")
+                    for i in range(2, length - 1, 2))
+            if not languages:
+                return {}
+            lang_id = languages[0]
+
+        missing = [i for i in set(indexes) if i and (language, i) not in cache]
+        results = await asyncio.gather(*(self._string_get(i, lang_id) for i in missing),
+                                       return_exceptions = True)
+        for index, result in zip(missing, results):
+            if isinstance(result, exception.TransferStalled):
+                cache[(language, index)] = None
+            elif not isinstance(result, BaseException):
+                cache[(language, index)] = result
+
+        return {i: cache[(language, i)] for i in indexes
+                if i and cache.get((language, i)) is not None}
+
+    async def _string_get(self, index, language):
+        desc = await self.standard_control(Request.GetDescriptor,
+                                           (DescriptorType.String << 8) | index,
+                                           language, 255)
+        return bytes(desc[2:desc[0]]).decode("utf-16-le")
 
     def interface_claim(self, interface):
         """
@@ -64,11 +231,30 @@ class Device:
         intf = self.handle.claimInterface(interface)
         return Interface(self, interface, self.descriptor[self.configuration][interface], intf)
 
+    async def interface_claim_async(self, interface):
+        """
+        Claim and retrieve an interface without blocking event loop.
+
+        :param interface: Interface index
+        :returns: An Interface instance
+        """
+        intf = await self.context._blocking(self.handle.claimInterface, interface)
+        configuration = await self.context._blocking(self.handle.getConfiguration)
+        return Interface(self, interface, self.descriptor[configuration][interface], intf)
+
     def reset(self):
         """
         Perform an USB reset for device
         """
         self.handle.resetDevice()
+        self.context.invalidate()
+
+    async def reset_async(self):
+        """
+        Perform an USB reset for device without blocking event loop
+        """
+        await self.context._blocking(self.handle.resetDevice)
+        self.context.invalidate()
 
     @property
     def kernel_driver_active(self):
@@ -81,60 +267,143 @@ class Device:
     def languages(self):
         return self.handle.getSupportedLanguageList()
 
+    def _completion_callback(self, callback):
+        """
+        Internal method wrapping a transfer callback for it to be run on
+        event loop, whatever the thread libusb events are handled on.
+        """
+        if self.metrics is not None:
+            callback = self.metrics.callback_wrap(callback)
+        return self.context.notifier.completion_callback(callback)
+
+    def _transfer_submit(self, transfer, timeout = 0):
+        """
+        Internal method submitting a transfer, accounted in metrics if enabled.
+
+        :param timeout: libusb timeout transfer is set up with, context
+          timer is updated for it if not 0
+        """
+        transfer.submit()
+        if timeout:
+            self.context.notifier.timeout_update()
+        if self.metrics is not None:
+            self.metrics.submitted(transfer)
+
+    def _timeout_ms(self, timeout, deadline):
+        """
+        Internal method converting a timeout in seconds and a deadline
+        in event loop time to a libusb transfer timeout in milliseconds,
+        0 for none. Earliest of both wins. Raises TransferTimeout if
+        already expired.
+        """
+        if deadline is not None:
+            left = deadline - self.context.loop.time()
+            timeout = left if timeout is None else min(timeout, left)
+        if timeout is None:
+            return 0
+        if timeout <= 0:
+            raise exception.TransferTimeout()
+        return max(1, math.ceil(timeout * 1000))
+
+    def _transfer_get(self, key = None):
+        """
+        Internal method for getting a transfer from pool.
+        See TransferPool.acquire().
+        """
+        return self.transfer_pool.acquire(key)
+
     @staticmethod
     def _on_transfer_done(transfer):
         """
         Internal method for handling transfers with Asyncio.
         """
         transfer_done = transfer.transfer_done
+        transfer.transfer_done = None
 
-        if not transfer_done or transfer_done.done():
-            return
+        try:
+            if transfer_done and not transfer_done.done():
+                Device._transfer_done_set(transfer, transfer_done)
+        finally:
+            transfer.pool.release(transfer)
 
-        transfer.transfer_done = None
-        
-        status = transfer.getStatus()
-        if status == usb1.TRANSFER_COMPLETED:
+    @staticmethod
+    def _transfer_done_set(transfer, transfer_done):
+        """
+        Internal method for handling transfers with Asyncio.
+        """
+        if transfer.getStatus() == usb1.TRANSFER_COMPLETED:
             transfer_done.set_result(transfer.getBuffer()[:transfer.getActualLength()])
-        elif status == usb1.TRANSFER_CANCELLED:
-            transfer_done.set_exception(asyncio.CancelledError())
+        else:
+            transfer_done.set_exception(Device._transfer_error(transfer))
+
+    @staticmethod
+    def _transfer_error(transfer):
+        """
+        Internal method mapping a failed transfer to an exception.
+        Timeouts tell what got transferred before expiry.
+        """
+        status = transfer.getStatus()
+        if status == usb1.TRANSFER_TIMED_OUT:
+            length = transfer.getActualLength()
+            return exception.TransferTimeout(length, transfer.getBuffer()[:length])
+        return Device._transfer_exception(status)
+
+    @staticmethod
+    def _transfer_exception(status):
+        """
+        Internal method mapping a failed transfer status to an exception.
+        """
+        if status == usb1.TRANSFER_CANCELLED:
+            return asyncio.CancelledError()
         elif status == usb1.TRANSFER_ERROR:
-            transfer_done.set_exception(exception.TransferError())
+            return exception.TransferError()
         elif status == usb1.TRANSFER_TIMED_OUT:
-            transfer_done.set_exception(exception.TransferTimeout())
+            return exception.TransferTimeout()
         elif status == usb1.TRANSFER_STALL:
-            transfer_done.set_exception(exception.TransferStalled())
+            return exception.TransferStalled()
         elif status == usb1.TRANSFER_NO_DEVICE:
-            transfer_done.set_exception(exception.DeviceError())
+            return exception.DeviceError()
         elif status == usb1.TRANSFER_OVERFLOW:
-            transfer_done.set_exception(exception.TransferOverflow())
+            return exception.TransferOverflow()
         else:
-            transfer_done.set_exception(RuntimeError())
+            return RuntimeError()
     
-    async def _transfer_run(self, transfer):
+    async def _transfer_run(self, transfer, timeout = 0):
         """
         Internal method for handling transfers with Asyncio.
+
+        :param timeout: libusb timeout transfer is set up with
         """
         transfer_done = self.context.loop.create_future()
         transfer.transfer_done = transfer_done
-        transfer.setCallback(self._on_transfer_done)
+        transfer.setCallback(self._transfer_callback)
         try:
-            transfer.submit()
-        except usb1.USBErrorNoDevice:
-            raise DeviceError()
+            self._transfer_submit(transfer, timeout)
+        except BaseException as e:
+            transfer.transfer_done = None
+            transfer.pool.release(transfer)
+            if isinstance(e, usb1.USBErrorNoDevice):
+                raise exception.DeviceError()
+            raise
 
         try:
             return await transfer_done
         except asyncio.CancelledError:
-            try:
-                transfer.cancel()
-            except:
-                pass
+            # Transfer goes back to pool from its callback, only cancel
+            # it if it is still ours.
+            if transfer.transfer_done is transfer_done:
+                try:
+                    transfer.cancel()
+                except:
+                    pass
             raise
 
-    async def control(self, type, recipient, request, value, index, data_or_length):
+    def _control_get(self, type, recipient, request, value, index, data_or_length,
+                     timeout = 0):
         """
-        Raw control IN/OUT request targetted on device.
+        Internal method getting a transfer set up for a control request.
+
+        :param timeout: libusb timeout, in milliseconds
         """
         bmRequestType = RequestType.pack(RequestTypeDirection.DeviceToHost
                                 if isinstance(data_or_length, int) else
@@ -142,41 +411,152 @@ class Device:
                                 type,
                                 recipient)
 
-        transfer = self.handle.getTransfer()
-        transfer.setControl(bmRequestType, request, value, index, data_or_length)
-        return await self._transfer_run(transfer)
+        transfer, _ = self._transfer_get()
+        transfer.setControl(bmRequestType, request, value, index, data_or_length,
+                            timeout = timeout)
+        return transfer
+
+    async def control(self, type, recipient, request, value, index, data_or_length,
+                      *, timeout = None, deadline = None):
+        """
+        Raw control IN/OUT request targetted on device.
+
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time request must be done by, None
+          for none
+        :raises TransferTimeout: On expiry, with partial length and data
+        """
+        timeout = self._timeout_ms(timeout, deadline)
+        transfer = self._control_get(type, recipient, request, value, index, data_or_length,
+                                     timeout)
+        return await self._transfer_run(transfer, timeout)
+
+    async def control_batch(self, requests, depth = None, completed = None,
+                            *, timeout = None, deadline = None):
+        """
+        Run a sequence of raw control requests targetted on device,
+        with up to depth of them in flight. Requests are submitted
+        again straight from completion callback, only the caller wakes
+        up once the whole batch is done, which is much cheaper than as
+        many control() calls.
+
+        A failing request does not stop the batch. If the call is
+        cancelled, requests in flight are cancelled and no other is
+        submitted.
+
+        :param requests: Iterable of (type, recipient, request, value,
+          index, data_or_length) tuples, as control() arguments
+        :param depth: Count of requests in flight, defaults to
+          CONTROL_BATCH_DEPTH
+        :param completed: Function called with (position, result) as
+          requests complete
+        :param timeout: Timeout of each request in seconds, None for none
+        :param deadline: Event loop time the whole batch must be done
+          by, requests not submitted yet by then time out
+        :returns: A list of results in requests order, failed requests
+          have their exception instead
+        """
+        requests = list(requests)
+        depth = depth or self.CONTROL_BATCH_DEPTH
+        results = [None] * len(requests)
+        pending = {}
+        done = self.context.loop.create_future()
+        position = 0
+
+        def result_set(i, result):
+            results[i] = result
+            if completed:
+                completed(i, result)
+
+        def submit():
+            nonlocal position
+            while len(pending) < depth and position < len(requests) and not done.done():
+                i = position
+                position += 1
+                try:
+                    ms = self._timeout_ms(timeout, deadline)
+                except exception.TransferTimeout as e:
+                    result_set(i, e)
+                    continue
+                transfer = self._control_get(*requests[i], ms)
+                transfer.setCallback(callback)
+                transfer.batch_position = i
+                try:
+                    self._transfer_submit(transfer, ms)
+                except usb1.USBError as e:
+                    transfer.pool.release(transfer)
+                    result_set(i, exception.DeviceError()
+                               if isinstance(e, usb1.USBErrorNoDevice) else e)
+                    continue
+                pending[i] = transfer
+
+            if not pending and not done.done():
+                done.set_result(None)
+
+        def on_done(transfer):
+            i = transfer.batch_position
+            del pending[i]
+            try:
+                if transfer.getStatus() == usb1.TRANSFER_COMPLETED:
+                    result_set(i, transfer.getBuffer()[:transfer.getActualLength()])
+                else:
+                    result_set(i, self._transfer_error(transfer))
+            finally:
+                transfer.pool.release(transfer)
+                submit()
+
+        callback = self._completion_callback(on_done)
+        submit()
 
-    async def standard_control(self, request, value, index, data_or_length):
+        try:
+            await done
+        except asyncio.CancelledError:
+            for transfer in list(pending.values()):
+                try:
+                    transfer.cancel()
+                except:
+                    pass
+            raise
+
+        return results
+
+    async def standard_control(self, request, value, index, data_or_length,
+                               *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on device.
         """
         return await self.control(RequestTypeType.Standard,
                                   RequestTypeRecipient.Device,
-                                  request, value, index, data_or_length)
+                                  request, value, index, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def class_control(self, request, value, index, data_or_length):
+    async def class_control(self, request, value, index, data_or_length,
+                            *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on device.
         """
         return await self.control(RequestTypeType.Class,
                                   RequestTypeRecipient.Device,
-                                  request, value, index, data_or_length)
+                                  request, value, index, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def vendor_control(self, request, value, index, data_or_length):
+    async def vendor_control(self, request, value, index, data_or_length,
+                             *, timeout = None, deadline = None):
         """
         Vendor-specific control IN/OUT request targetted on device.
         """
         return await self.control(RequestTypeType.Vendor,
                                   RequestTypeRecipient.Device,
-                                  request, value, index, data_or_length)
+                                  request, value, index, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def clear_feature(self, feature_selector):
+    async def clear_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           0, b'')
+                                           0, b'', timeout = timeout, deadline = deadline)
 
-    async def set_feature(self, feature_selector):
+    async def set_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           0, b'')
+                                           0, b'', timeout = timeout, deadline = deadline)
     
 class Interface:
     """
@@ -205,52 +585,66 @@ class Interface:
 
     @alternate.setter
     def alternate(self, setting):
-        self.device.setInterfaceAltSetting(self.interface, setting)
+        self.device.handle.setInterfaceAltSetting(self.interface, setting)
         self.__alt_setting = setting
 
     def kernel_driver_detach(self):
         """
         Ask for kernel driver detach
         """
-        self.device.detachKernelDriver(self.interface)
+        self.device.handle.detachKernelDriver(self.interface)
 
     def kernel_driver_attach(self):
         """
         Ask for kernel driver attach
         """
-        self.device.attachKernelDriver(self.interface)
+        self.device.handle.attachKernelDriver(self.interface)
+
+    async def control(self, type, recipient, request, value, index, data_or_length,
+                      *, timeout = None, deadline = None):
+        """
+        Raw control IN/OUT request, see Device.control().
+        """
+        return await self.device.control(type, recipient, request, value, index,
+                                         data_or_length, timeout = timeout, deadline = deadline)
 
-    async def standard_control(self, request, value, data_or_length):
+    async def standard_control(self, request, value, data_or_length,
+                               *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on interface.
         """
         return await self.control(RequestTypeType.Standard,
                                   RequestTypeRecipient.Interface,
-                                  request, value, self.interface, data_or_length)
+                                  request, value, self.interface, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def class_control(self, request, value, data_or_length):
+    async def class_control(self, request, value, data_or_length,
+                            *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on interface.
         """
         return await self.control(RequestTypeType.Class,
                                   RequestTypeRecipient.Interface,
-                                  request, value, self.interface, data_or_length)
+                                  request, value, self.interface, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def vendor_control(self, request, value, data_or_length):
+    async def vendor_control(self, request, value, data_or_length,
+                             *, timeout = None, deadline = None):
         """
         Vendor-specific control IN/OUT request targetted on interface.
         """
         return await self.control(RequestTypeType.Vendor,
                                   RequestTypeRecipient.Interface,
-                                  request, value, self.interface, data_or_length)
+                                  request, value, self.interface, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def clear_feature(self, feature_selector):
+    async def clear_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           b'')
+                                           b'', timeout = timeout, deadline = deadline)
 
-    async def set_feature(self, feature_selector):
+    async def set_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           b'')
+                                           b'', timeout = timeout, deadline = deadline)
 
     def open(self, endpoint):
         """
@@ -273,6 +667,11 @@ class Interface:
                 return InterruptInEndpoint(self.device, a, s, endpoint.interval)
             else:
                 return InterruptOutEndpoint(self.device, a, s, endpoint.interval)
+        elif t == "isochronous":
+            if a & usb1.ENDPOINT_DIR_MASK == usb1.ENDPOINT_IN:
+                return IsochronousInEndpoint(self.device, a, s, endpoint.interval)
+            else:
+                return IsochronousOutEndpoint(self.device, a, s, endpoint.interval)
         else:
             raise ValueError(t)
 
@@ -285,66 +684,581 @@ class Endpoint:
         self.address = address
         self.mps = mps
 
+    @property
+    def metrics(self):
+        """
+        Transfer metrics for this endpoint, None unless enabled on context
+        """
+        if self.device.metrics is None:
+            return None
+        return self.device.metrics.endpoint(self.address)
+
     def resume(self):
         """
         Resume servicing endpoint, clears halt condition.
         """
         self.device.handle.clearHalt(self.address)
 
-    async def standard_control(self, request, value, data_or_length):
+    async def control(self, type, recipient, request, value, index, data_or_length,
+                      *, timeout = None, deadline = None):
+        """
+        Raw control IN/OUT request, see Device.control().
+        """
+        return await self.device.control(type, recipient, request, value, index,
+                                         data_or_length, timeout = timeout, deadline = deadline)
+
+    async def standard_control(self, request, value, data_or_length,
+                               *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on endpoint.
         """
         return await self.control(RequestTypeType.Standard,
                                   RequestTypeRecipient.Endpoint,
-                                  request, value, self.address, data_or_length)
+                                  request, value, self.address, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def class_control(self, request, value, data_or_length):
+    async def class_control(self, request, value, data_or_length,
+                            *, timeout = None, deadline = None):
         """
         Standard control IN/OUT request targetted on endpoint.
         """
         return await self.control(RequestTypeType.Class,
                                   RequestTypeRecipient.Endpoint,
-                                  request, value, self.address, data_or_length)
+                                  request, value, self.address, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def vendor_control(self, request, value, data_or_length):
+    async def vendor_control(self, request, value, data_or_length,
+                             *, timeout = None, deadline = None):
         """
         Vendor-specific control IN/OUT request targetted on endpoint.
         """
         return await self.control(RequestTypeType.Vendor,
                                   RequestTypeRecipient.Endpoint,
-                                  request, value, self.address, data_or_length)
+                                  request, value, self.address, data_or_length,
+                                  timeout = timeout, deadline = deadline)
 
-    async def clear_feature(self, feature_selector):
+    async def clear_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           b'')
+                                           b'', timeout = timeout, deadline = deadline)
 
-    async def set_feature(self, feature_selector):
+    async def set_feature(self, feature_selector, *, timeout = None, deadline = None):
         return await self.standard_control(Request.ClearFeature, feature_selector,
-                                           b'')
+                                           b'', timeout = timeout, deadline = deadline)
         
+class TransferStream:
+    """
+    Base of objects keeping transfers in flight on an endpoint. This is
+    an implementation detail (i.e. no API stability).
+
+    Subclasses list the transfers they own in _transfers, submit them
+    with _submit() and handle completions in _on_transfer_done(), which
+    should account _inflight and call _wake(). Consumer side waits
+    with _wait(). First failure is kept in _error. Subclasses provide
+    close(), called on context manager exit.
+    """
+    CLOSED = "Stream closed"
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self._callback = endpoint.device._completion_callback(self._on_transfer_done)
+        self._transfers = []
+        self._inflight = 0
+        self._waiter = None
+        self._error = None
+        self._closed = False
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError(self.CLOSED)
+
+    def _submit(self, transfer):
+        """
+        Submit a transfer, failures are converted and handed to
+        _submit_failed().
+
+        :returns: Whether transfer got submitted
+        """
+        try:
+            self.endpoint.device._transfer_submit(transfer)
+        except usb1.USBError as e:
+            self._submit_failed(transfer, exception.DeviceError()
+                                if isinstance(e, usb1.USBErrorNoDevice) else
+                                exception.TransferError())
+            return False
+        self._inflight += 1
+        return True
+
+    def _submit_failed(self, transfer, error):
+        self._fail(error)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._cancel()
+
+    def _cancel(self):
+        for transfer in self._transfers:
+            if transfer.isSubmitted():
+                try:
+                    transfer.cancel()
+                except:
+                    pass
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait(self):
+        self._waiter = self.endpoint.device.context.loop.create_future()
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+
+    def _transfer_free(self, transfer):
+        """
+        Give back a transfer once stream is closed.
+        """
+        self.endpoint.device.transfer_pool.release(transfer)
+
+    async def _release(self):
+        """
+        Wait for transfers in flight to come back, then give them all
+        back.
+        """
+        while self._inflight:
+            await self._wait()
+        for transfer in self._transfers:
+            self._transfer_free(transfer)
+        self._transfers = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
 class BulkEndpoint(Endpoint):
     pass
 
 class BulkInEndpoint(BulkEndpoint):
-    async def read(self, size = 0):
+    async def read(self, size = 0, *, timeout = None, deadline = None):
         """
         Bulk IN transfer
+
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :raises TransferTimeout: On expiry, with partial length and data
         """
         size = size or self.mps
 
-        transfer = self.device.handle.getTransfer()
-        transfer.setBulk(self.address, size)
-        return await self.device._transfer_run(transfer)
+        timeout = self.device._timeout_ms(timeout, deadline)
+        key = None if timeout else ("bulk", self.address, size)
+        transfer, ready = self.device._transfer_get(key)
+        if not ready:
+            transfer.setBulk(self.address, size, timeout = timeout)
+            transfer.pool_key = key
+        return await self.device._transfer_run(transfer, timeout)
+
+    async def readinto(self, buffer, *, timeout = None, deadline = None):
+        """
+        Bulk IN transfer directly into a writable buffer, without copy.
+
+        :param buffer: Writable buffer (bytearray, mmap, memoryview...),
+          transfer size is its size in bytes
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :returns: Received length
+        """
+        view = memoryview(buffer).cast("B")
+
+        timeout = self.device._timeout_ms(timeout, deadline)
+        transfer, _ = self.device._transfer_get()
+        transfer.setBulk(self.address, view, timeout = timeout)
+        transfer.pool_key = TransferPool.BORROWED
+        return len(await self.device._transfer_run(transfer, timeout))
+
+    def stream(self, size = 0, count = 4, backlog = None, copy = True):
+        """
+        Start continuous Bulk IN reception on endpoint.
+
+        :param size: Size of each transfer, defaults to endpoint MPS
+        :param count: Count of transfers kept queued on endpoint
+        :param backlog: Count of received buffers waiting for consumer
+          above which completed transfers stop being resubmitted,
+          defaults to count
+        :param copy: Whether to yield copies of received data. If
+          false, memoryviews on transfer buffers are yielded, they are
+          only valid until next buffer is retrieved
+        :returns: A started BulkInStream instance
+        """
+        stream = BulkInStream(self, size or self.mps, count, backlog or count, copy)
+        stream.start()
+        return stream
+
+class BulkInStream(TransferStream):
+    """
+    Continuous Bulk IN reader, should be spawned by BulkInEndpoint.stream().
+
+    Stream keeps a set of transfers queued on the endpoint and
+    resubmits each of them as soon as it completes. If consumer lags
+    behind by more than backlog buffers, completed transfers are
+    parked until consumer catches up.
+
+    Stream is an asynchronous iterator over received buffers and an
+    asynchronous context manager closing itself on exit:
+
+    .. code:: python
+
+      async with endpoint_handle.stream(16384, count = 8) as stream:
+          async for data in stream:
+              handle(data)
+
+    In no-copy mode, stream yields memoryviews on transfer buffers.
+    Such a transfer is only resubmitted when consumer retrieves next
+    buffer, so backlog is bound to count.
+    """
+    def __init__(self, endpoint, size, count, backlog, copy = True):
+        TransferStream.__init__(self, endpoint)
+        self.size = size
+        self.count = count
+        self.backlog = backlog
+        self.copy = copy
+        self.__held = None
+        self.__ready = collections.deque()
+        self.__parked = []
+
+    def start(self):
+        """
+        Allocate and submit stream transfers.
+        """
+        for i in range(self.count):
+            transfer = self._transfer_alloc()
+            transfer.setCallback(self._callback)
+            self._transfers.append(transfer)
+            self._submit(transfer)
+
+    def _transfer_alloc(self):
+        """
+        Get a transfer set up for stream.
+        """
+        key = ("bulk", self.endpoint.address, self.size)
+        transfer, ready = self.endpoint.device._transfer_get(key)
+        if not ready:
+            transfer.setBulk(self.endpoint.address, self.size)
+            transfer.pool_key = key
+        return transfer
+
+    def _result(self, transfer):
+        """
+        Buffer to yield to consumer for a completed transfer.
+        """
+        length = transfer.getActualLength()
+        if self.copy:
+            return transfer.getBuffer()[:length]
+        return memoryview(transfer.getBuffer())[:length]
+
+    @property
+    def pending(self):
+        """
+        Count of received buffers waiting for consumer
+        """
+        return len(self.__ready)
+
+    def _on_transfer_done(self, transfer):
+        """
+        Internal method called on transfer completion, resubmits transfer
+        unless consumer lags behind.
+        """
+        self._inflight -= 1
+        status = transfer.getStatus()
+
+        if status == usb1.TRANSFER_COMPLETED and not self.copy:
+            self.__ready.append(transfer)
+        elif status == usb1.TRANSFER_COMPLETED:
+            self.__ready.append(self._result(transfer))
+            if self._closed or self._error:
+                pass
+            elif len(self.__ready) < self.backlog:
+                self._submit(transfer)
+            else:
+                self.__parked.append(transfer)
+        elif status != usb1.TRANSFER_CANCELLED:
+            self._fail(Device._transfer_exception(status))
+
+        self._wake()
+
+    def _cancel(self):
+        self.__parked.clear()
+        TransferStream._cancel(self)
+
+    async def read(self):
+        """
+        Retrieve next received buffer, wait for one if none is pending.
+        Raises transfer error exception if stream failed, ValueError if
+        stream is closed.
+        """
+        held = self.__held
+        if held is not None:
+            self.__held = None
+            if not self._closed and self._error is None:
+                self._submit(held)
+
+        while not self.__ready:
+            self._check()
+            await self._wait()
+
+        data = self.__ready.popleft()
+
+        if not self.copy:
+            self.__held = data
+            return self._result(data)
+
+        while self.__parked and len(self.__ready) < self.backlog:
+            self._submit(self.__parked.pop(0))
+
+        return data
+
+    async def close(self):
+        """
+        Stop stream, cancel pending transfers and wait for them to be
+        returned. Buffers already received are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._cancel()
+        await self._release()
+        self.__ready.clear()
+        self.__held = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and not self.__ready:
+            raise StopAsyncIteration
+        return await self.read()
 
 class BulkOutEndpoint(BulkEndpoint):
-    async def write(self, data):
+    async def write(self, data, *, timeout = None, deadline = None):
         """
         Bulk OUT transfer
+
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :raises TransferTimeout: On expiry, with partial length
+        """
+        timeout = self.device._timeout_ms(timeout, deadline)
+        key = None if timeout else ("bulk", self.address)
+        transfer, ready = self.device._transfer_get(key)
+        if ready:
+            transfer.setBuffer(data)
+        else:
+            transfer.setBulk(self.address, data, timeout = timeout)
+            transfer.pool_key = key
+        return await self.device._transfer_run(transfer, timeout)
+
+    def writer(self, size = 0, count = 4, queue = None):
+        """
+        Get a pipelined writer on endpoint.
+
+        :param size: Maximum transfer size small writes are coalesced up
+          to, defaults to 32 times endpoint MPS
+        :param count: Count of transfers kept in flight
+        :param queue: Count of transfer-sized buffers that may wait for a
+          free transfer before write() blocks, defaults to count
+        :returns: A BulkOutWriter instance
+        """
+        return BulkOutWriter(self, size or 32 * self.mps, count, queue or count)
+
+class BulkOutWriter(TransferStream):
+    """
+    Pipelined Bulk OUT writer, should be spawned by BulkOutEndpoint.writer().
+
+    Written data is coalesced up to transfer size and queued. Up to
+    count transfers are kept in flight. write() only blocks when the
+    queue is full. Partial transfer data is only sent on flush(),
+    drain() or close().
+
+    Transfer failures are recorded in errors as (offset, length,
+    exception) tuples, where offset is the position of failed transfer
+    data in written stream. Once a transfer failed, queued data is
+    dropped and further write(), drain() or close() calls raise the
+    first error.
+
+    .. code:: python
+
+      async with endpoint_handle.writer(count = 8) as writer:
+          for block in blocks:
+              await writer.write(block)
+    """
+
+    CLOSED = "Writer closed"
+
+    def __init__(self, endpoint, size, count, queue):
+        TransferStream.__init__(self, endpoint)
+        self.size = size
+        self.count = count
+        self.queue = queue
+        self.errors = []
+        self.bytes_written = 0
+        self.__buffer = bytearray()
+        self.__queue = collections.deque()
+        self.__offset = 0
+        self.__idle = []
+
+    def _enqueue(self, chunk):
+        self.__queue.append((self.__offset, chunk))
+        self.__offset += len(chunk)
+
+    def _transfer_get(self):
+        if self.__idle:
+            return self.__idle.pop()
+        if len(self._transfers) >= self.count:
+            return None
+        key = ("bulk", self.endpoint.address)
+        transfer, ready = self.endpoint.device._transfer_get(key)
+        if not ready:
+            transfer.setBulk(self.endpoint.address, 0)
+            transfer.pool_key = key
+        transfer.setCallback(self._callback)
+        self._transfers.append(transfer)
+        return transfer
+
+    def _pump(self):
+        while self.__queue and not self.errors:
+            transfer = self._transfer_get()
+            if transfer is None:
+                return
+            offset, chunk = self.__queue.popleft()
+            transfer.setBuffer(chunk)
+            transfer.chunk_offset = offset
+            self._submit(transfer)
+
+    def _submit_failed(self, transfer, error):
+        self.__idle.append(transfer)
+        self._error_add(transfer.chunk_offset, len(transfer.getBuffer()), error)
+
+    def _on_transfer_done(self, transfer):
+        """
+        Internal method called on transfer completion, submits next
+        queued buffer.
         """
-        transfer = self.device.handle.getTransfer()
-        transfer.setBulk(self.address, data)
-        return await self.device._transfer_run(transfer)
+        self._inflight -= 1
+        self.__idle.append(transfer)
+        status = transfer.getStatus()
+
+        if status == usb1.TRANSFER_COMPLETED:
+            self.bytes_written += transfer.getActualLength()
+        elif status != usb1.TRANSFER_CANCELLED:
+            self._error_add(transfer.chunk_offset, len(transfer.getBuffer()),
+                            Device._transfer_exception(status))
+
+        self._pump()
+        self._wake()
+
+    def _error_add(self, offset, length, error):
+        """
+        Record a failed transfer and drop queued data. Transfers in
+        flight are left to complete.
+        """
+        self.errors.append((offset, length, error))
+        if self._error is None:
+            self._error = error
+        self.__queue.clear()
+
+    async def write(self, data):
+        """
+        Queue data for sending, wait for queue room if full.
+        """
+        self._check()
+
+        view = memoryview(data).cast("B")
+        buf = self.__buffer
+        off = 0
+
+        if buf:
+            off = min(self.size - len(buf), len(view))
+            buf += view[:off]
+            if len(buf) == self.size:
+                self._enqueue(buf)
+                self.__buffer = bytearray()
+
+        while len(view) - off >= self.size:
+            self._enqueue(bytearray(view[off : off + self.size]))
+            off += self.size
+
+        if off < len(view):
+            self.__buffer += view[off:]
+
+        self._pump()
+
+        while len(self.__queue) > self.queue:
+            await self._wait()
+            self._check()
+
+    def flush(self):
+        """
+        Queue pending partial transfer data for sending.
+        """
+        self._check()
+
+        if self.__buffer:
+            self._enqueue(self.__buffer)
+            self.__buffer = bytearray()
+        self._pump()
+
+    async def drain(self):
+        """
+        Flush and wait for all written data to be sent.
+        """
+        self.flush()
+
+        while self.__queue or self._inflight:
+            await self._wait()
+
+        self._check()
+
+    async def close(self):
+        """
+        Drain writer and give its transfers back.
+        """
+        if self._closed:
+            return
+        try:
+            await self.drain()
+        finally:
+            self._closed = True
+            await self._release()
+
+    async def abort(self):
+        """
+        Drop queued data, cancel transfers in flight and give them back.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.__queue.clear()
+        self.__buffer = bytearray()
+        self._cancel()
+        await self._release()
+
+    async def _release(self):
+        await TransferStream._release(self)
+        self.__idle = []
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.abort()
 
 class InterruptEndpoint(Endpoint):
     def __init__(self, device, address, mps, interval):
@@ -352,27 +1266,449 @@ class InterruptEndpoint(Endpoint):
         self.interval = interval
 
 class InterruptInEndpoint(InterruptEndpoint):
-    async def read(self, size = 0):
+    async def read(self, size = 0, *, timeout = None, deadline = None):
         """
         Interrupt IN transfer
+
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :raises TransferTimeout: On expiry, with partial length and data
+        """
+        size = size or self.mps
+
+        if size > self.mps:
+            raise ValueError("Size too big for max packet size")
+
+        timeout = self.device._timeout_ms(timeout, deadline)
+        key = None if timeout else ("interrupt", self.address, size)
+        transfer, ready = self.device._transfer_get(key)
+        if not ready:
+            transfer.setInterrupt(self.address, size, timeout = timeout)
+            transfer.pool_key = key
+        return await self.device._transfer_run(transfer, timeout)
+
+    async def readinto(self, buffer, *, timeout = None, deadline = None):
+        """
+        Interrupt IN transfer directly into a writable buffer, without copy.
+
+        :param buffer: Writable buffer, transfer size is its size in bytes
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :returns: Received length
+        """
+        view = memoryview(buffer).cast("B")
+
+        if len(view) > self.mps:
+            raise ValueError("Buffer too big for max packet size")
+
+        timeout = self.device._timeout_ms(timeout, deadline)
+        transfer, _ = self.device._transfer_get()
+        transfer.setInterrupt(self.address, view, timeout = timeout)
+        transfer.pool_key = TransferPool.BORROWED
+        return len(await self.device._transfer_run(transfer, timeout))
+
+    def subscribe(self, size = 0, count = 2, capacity = 64):
+        """
+        Start continuous Interrupt IN reception on endpoint. Host
+        controller polls endpoint at its interval as long as transfers
+        are queued, which they always are.
+
+        :param size: Size of each transfer, defaults to endpoint MPS
+        :param count: Count of transfers kept queued on endpoint
+        :param capacity: Count of received reports kept for consumer,
+          oldest ones are dropped beyond
+        :returns: A started InterruptInSubscription instance
         """
         size = size or self.mps
 
         if size > self.mps:
             raise ValueError("Size too big for max packet size")
 
-        transfer = self.device.handle.getTransfer()
-        transfer.setInterrupt(self.address, size)
-        return await self.device._transfer_run(transfer)
+        subscription = InterruptInSubscription(self, size, count, capacity)
+        subscription.start()
+        return subscription
+
+class InterruptInSubscription(TransferStream):
+    """
+    Continuous Interrupt IN reader, should be spawned by
+    InterruptInEndpoint.subscribe().
+
+    Unlike BulkInStream, transfers are resubmitted as soon as they
+    complete whatever the consumer does, so no report is missed
+    between submissions. Reports are kept in a ring buffer of capacity
+    entries. When consumer lags behind, oldest reports are dropped and
+    accounted in overruns.
+
+    Consumer is woken up once for all reports received since it last
+    waited. They may be taken one by one, or all at once:
+
+    .. code:: python
+
+      async with endpoint_handle.subscribe(capacity = 256) as reports:
+          while True:
+              for report in await reports.drain():
+                  handle(report)
+    """
+
+    CLOSED = "Subscription closed"
+
+    def __init__(self, endpoint, size, count, capacity):
+        TransferStream.__init__(self, endpoint)
+        self.size = size
+        self.count = count
+        self.capacity = capacity
+        self.received = 0
+        self.overruns = 0
+        self.__ready = collections.deque(maxlen = capacity)
+
+    def start(self):
+        """
+        Allocate and submit subscription transfers.
+        """
+        key = ("interrupt", self.endpoint.address, self.size)
+        for i in range(self.count):
+            transfer, ready = self.endpoint.device._transfer_get(key)
+            if not ready:
+                transfer.setInterrupt(self.endpoint.address, self.size)
+                transfer.pool_key = key
+            transfer.setCallback(self._callback)
+            self._transfers.append(transfer)
+            self._submit(transfer)
+
+    @property
+    def pending(self):
+        """
+        Count of received reports waiting for consumer
+        """
+        return len(self.__ready)
+
+    def _on_transfer_done(self, transfer):
+        """
+        Internal method called on transfer completion, queues report
+        and resubmits transfer straight away.
+        """
+        self._inflight -= 1
+        status = transfer.getStatus()
+
+        if status == usb1.TRANSFER_COMPLETED:
+            if len(self.__ready) == self.capacity:
+                self.overruns += 1
+            self.__ready.append(transfer.getBuffer()[:transfer.getActualLength()])
+            self.received += 1
+            if not self._closed and self._error is None:
+                self._submit(transfer)
+        elif status != usb1.TRANSFER_CANCELLED:
+            self._fail(Device._transfer_exception(status))
+
+        self._wake()
+
+    async def _pending_wait(self):
+        while not self.__ready:
+            self._check()
+            await self._wait()
+
+    async def get(self):
+        """
+        Retrieve oldest received report, wait for one if none is
+        pending. Raises transfer error exception if subscription
+        failed, once pending reports are consumed, ValueError if
+        subscription is closed.
+        """
+        await self._pending_wait()
+        return self.__ready.popleft()
+
+    async def drain(self, limit = None):
+        """
+        Retrieve all received reports, oldest first, wait for at least
+        one if none is pending.
+
+        :param limit: Maximum count of reports to retrieve, None for all
+        :returns: A list of reports
+        """
+        await self._pending_wait()
+        ready = self.__ready
+        if limit is None or limit >= len(ready):
+            reports = list(ready)
+            ready.clear()
+            return reports
+        return [ready.popleft() for i in range(limit)]
+
+    async def close(self):
+        """
+        Stop subscription, cancel pending transfers and wait for them to
+        be returned. Reports already received are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._cancel()
+        await self._release()
+        self.__ready.clear()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and not self.__ready:
+            raise StopAsyncIteration
+        return await self.get()
 
 class InterruptOutEndpoint(InterruptEndpoint):
-    async def write(self, data):
+    async def write(self, data, *, timeout = None, deadline = None):
         """
         Interrupt OUT transfer
+
+        :param timeout: Timeout in seconds, None for none
+        :param deadline: Event loop time transfer must be done by, None
+          for none
+        :raises TransferTimeout: On expiry, with partial length
         """
         if len(data) > self.mps:
             raise ValueError("Data buffer too big for max packet size")
 
-        transfer = self.device.handle.getTransfer()
-        transfer.setInterrupt(self.address, data)
-        return await self.device._transfer_run(transfer)
+        timeout = self.device._timeout_ms(timeout, deadline)
+        key = None if timeout else ("interrupt", self.address)
+        transfer, ready = self.device._transfer_get(key)
+        if ready:
+            transfer.setBuffer(data)
+        else:
+            transfer.setInterrupt(self.address, data, timeout = timeout)
+            transfer.pool_key = key
+        return await self.device._transfer_run(transfer, timeout)
+
+class IsochronousEndpoint(Endpoint):
+    def __init__(self, device, address, mps, interval):
+        Endpoint.__init__(self, device, address, mps)
+        self.interval = interval
+
+    @property
+    def packet_size(self):
+        """
+        Maximum payload of one isochronous packet, in bytes, including
+        additional transactions per microframe for high-speed endpoints.
+        """
+        return (self.mps & 0x7ff) * (((self.mps >> 11) & 0x3) + 1)
+
+class IsochronousInEndpoint(IsochronousEndpoint):
+    def stream(self, packets = 32, count = 8, backlog = None, copy = True):
+        """
+        Start continuous isochronous IN reception on endpoint.
+
+        :param packets: Count of isochronous packets per transfer
+        :param count: Count of transfers kept queued on endpoint
+        :param backlog: Count of received batches waiting for consumer
+          above which completed transfers stop being resubmitted,
+          defaults to count
+        :param copy: Whether to yield batches on copies of transfer
+          buffers, see BulkInEndpoint.stream()
+        :returns: A started IsochronousInStream instance
+        """
+        stream = IsochronousInStream(self, packets, count, backlog or count, copy)
+        stream.start()
+        return stream
+
+class IsochronousOutEndpoint(IsochronousEndpoint):
+    def stream(self, packets = 32, count = 8):
+        """
+        Get an isochronous OUT stream on endpoint.
+
+        :param packets: Maximum count of isochronous packets per transfer
+        :param count: Count of transfers kept in flight
+        :returns: An IsochronousOutStream instance
+        """
+        return IsochronousOutStream(self, packets, count)
+
+def _iso_descriptors(transfer):
+    """
+    Internal helper returning a copy of isochronous packet descriptors
+    of a completed transfer, as a flat unsigned int memoryview of
+    (length, actual_length, status) triplets.
+    """
+    table = array.array("I")
+    for packet in transfer.getISOSetupList():
+        table.extend((packet["length"], packet["actual_length"], packet["status"]))
+    return memoryview(table)
+
+class IsochronousBatch:
+    """
+    Batch of isochronous packets carried by one transfer.
+
+    Packet data is held in a single buffer, packet i starts at offset
+    i * packet_size. Per-packet actual lengths and statuses are
+    exposed as unsigned int memoryviews, no Python object is created
+    per packet unless explicitly asked for.
+    """
+    def __init__(self, data, packet_size, descriptors):
+        self.data = data
+        self.packet_size = packet_size
+        self.descriptors = descriptors
+
+    def __len__(self):
+        """
+        Count of packets in batch
+        """
+        return len(self.descriptors) // 3
+
+    @property
+    def lengths(self):
+        """
+        Actual length of each packet
+        """
+        return self.descriptors[1::3]
+
+    @property
+    def status(self):
+        """
+        Transfer status of each packet, usb1.TRANSFER_COMPLETED on success
+        """
+        return self.descriptors[2::3]
+
+    @property
+    def errors(self):
+        """
+        Count of packets that were not successfully transferred
+        """
+        return len(self) - self.status.tolist().count(usb1.TRANSFER_COMPLETED)
+
+    def packet(self, index):
+        """
+        Data of a packet, as a memoryview
+        """
+        offset = index * self.packet_size
+        return memoryview(self.data)[offset : offset + self.descriptors[index * 3 + 1]]
+
+    def __iter__(self):
+        """
+        Iterate over packets data
+        """
+        for i in range(len(self)):
+            yield self.packet(i)
+
+class IsochronousInStream(BulkInStream):
+    """
+    Continuous isochronous IN reader, should be spawned by
+    IsochronousInEndpoint.stream().
+
+    Works as BulkInStream, but transfers carry many isochronous
+    packets each, and stream yields IsochronousBatch objects.
+    """
+    def __init__(self, endpoint, packets, count, backlog, copy = True):
+        BulkInStream.__init__(self, endpoint, packets * endpoint.packet_size,
+                              count, backlog, copy)
+        self.packets = packets
+
+    def _transfer_alloc(self):
+        transfer = self.endpoint.device.handle.getTransfer(iso_packets = self.packets)
+        transfer.setIsochronous(self.endpoint.address, self.size)
+        return transfer
+
+    def _transfer_free(self, transfer):
+        pass
+
+    def _result(self, transfer):
+        data = transfer.getBuffer()
+        if self.copy:
+            data = bytes(data)
+        return IsochronousBatch(data, self.endpoint.packet_size, _iso_descriptors(transfer))
+
+class IsochronousOutStream(TransferStream):
+    """
+    Isochronous OUT writer, should be spawned by IsochronousOutEndpoint.stream().
+
+    Each write() call sends a batch of packets in one transfer. Up to
+    count transfers are kept in flight, write() waits for one of them
+    to complete when all are busy.
+
+    Packets that failed are counted in packet_errors, transfer-level
+    failures stop the stream and are raised from next call.
+    """
+    def __init__(self, endpoint, packets, count):
+        TransferStream.__init__(self, endpoint)
+        self.packets = packets
+        self.count = count
+        self.packet_errors = 0
+        self.bytes_written = 0
+        self.__idle = []
+
+    def _transfer_free(self, transfer):
+        pass
+
+    def _submit_failed(self, transfer, error):
+        self.__idle.append(transfer)
+        if self._error is None:
+            self._error = error
+
+    def _on_transfer_done(self, transfer):
+        """
+        Internal method called on transfer completion.
+        """
+        self._inflight -= 1
+        self.__idle.append(transfer)
+        status = transfer.getStatus()
+
+        if status == usb1.TRANSFER_COMPLETED:
+            batch = IsochronousBatch(None, 0, _iso_descriptors(transfer))
+            self.packet_errors += batch.errors
+            self.bytes_written += sum(batch.lengths)
+        elif status != usb1.TRANSFER_CANCELLED and self._error is None:
+            self._error = Device._transfer_exception(status)
+
+        self._wake()
+
+    async def write(self, data, lengths = None):
+        """
+        Send a batch of isochronous packets.
+
+        :param data: Packets data, concatenated
+        :param lengths: Length of each packet, defaults to splitting
+          data in endpoint packet_size chunks
+        """
+        self._check()
+
+        packet_size = self.endpoint.packet_size
+        if lengths is None:
+            full, last = divmod(len(data), packet_size)
+            lengths = [packet_size] * full + ([last] if last else [])
+        if not lengths or len(lengths) > self.packets:
+            raise ValueError("Packet count out of range")
+
+        while not self.__idle and len(self._transfers) >= self.count:
+            await self._wait()
+            self._check()
+
+        if self.__idle:
+            transfer = self.__idle.pop()
+        else:
+            transfer = self.endpoint.device.handle.getTransfer(iso_packets = self.packets)
+            self._transfers.append(transfer)
+
+        transfer.setIsochronous(self.endpoint.address, data,
+                                callback = self._callback,
+                                iso_transfer_length_list = lengths)
+        if not self._submit(transfer):
+            self._check()
+
+    async def drain(self):
+        """
+        Wait for all submitted batches to be sent.
+        """
+        while self._inflight:
+            await self._wait()
+        self._check()
+
+    async def close(self):
+        """
+        Drain stream and drop its transfers. If draining fails,
+        transfers still in flight are cancelled and waited for.
+        """
+        if self._closed:
+            return
+        try:
+            await self.drain()
+        finally:
+            self._closed = True
+            self._cancel()
+            await self._release()
+            self.__idle = []
@@ -0,0 +1,172 @@
+import bisect
+import time
+import usb1
+
+__all__ = ["Metrics", "device_name"]
+
+STATUS_NAMES = {
+    usb1.TRANSFER_COMPLETED: "completed",
+    usb1.TRANSFER_ERROR: "error",
+    usb1.TRANSFER_TIMED_OUT: "timed_out",
+    usb1.TRANSFER_CANCELLED: "cancelled",
+    usb1.TRANSFER_STALL: "stall",
+    usb1.TRANSFER_NO_DEVICE: "no_device",
+    usb1.TRANSFER_OVERFLOW: "overflow",
+}
+
+def device_name(key):
+    """
+    Name of a device key (bus, ports, address) for snapshots, like
+    "1-2.3@5", ports are "0" for a root hub.
+    """
+    bus, ports, address = key
+    return "%d-%s@%d" % (bus, ".".join(map(str, ports)) or "0", address)
+
+class EndpointMetrics:
+    """
+    Transfer counters for one endpoint. Should be spawned by
+    DeviceMetrics.endpoint().
+    """
+    __slots__ = ("submitted", "statuses", "bytes", "buckets", "latency_sum")
+
+    def __init__(self, bounds):
+        self.submitted = 0
+        self.statuses = {}
+        self.bytes = 0
+        self.buckets = [0] * (len(bounds) + 1)
+        self.latency_sum = 0.0
+
+    def record(self, bounds, status, length, latency):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == usb1.TRANSFER_COMPLETED:
+            self.bytes += length
+        self.buckets[bisect.bisect_left(bounds, latency)] += 1
+        self.latency_sum += latency
+
+    def snapshot(self, bounds):
+        """
+        Get counters as a dict. Bytes are the ones of completed
+        transfers. Latency buckets are cumulative, keyed by their upper
+        bound in seconds as a string ("+Inf" for the last one),
+        Prometheus style.
+        """
+        buckets = {}
+        total = 0
+        for bound, count in zip(bounds + (None,), self.buckets):
+            total += count
+            buckets["+Inf" if bound is None else repr(float(bound))] = total
+
+        return {
+            "submitted": self.submitted,
+            "statuses": {STATUS_NAMES.get(s, str(s)): c for s, c in self.statuses.items()},
+            "bytes": self.bytes,
+            "latency": {
+                "buckets": buckets,
+                "sum": self.latency_sum,
+                "count": total,
+            },
+        }
+
+class DeviceMetrics:
+    """
+    Transfer counters for one device, by endpoint address. Should be
+    spawned by Metrics.device().
+    """
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+        self.endpoints = {}
+
+    def endpoint(self, address):
+        """
+        Get counters for an endpoint, creating them if needed.
+        """
+        ep = self.endpoints.get(address)
+        if ep is None:
+            ep = self.endpoints[address] = EndpointMetrics(self.metrics.LATENCY_BOUNDS)
+        return ep
+
+    def submitted(self, transfer):
+        """
+        Account a transfer just submitted.
+        """
+        transfer.submit_time = time.perf_counter()
+        self.endpoint(transfer.getEndpoint()).submitted += 1
+
+    def completed(self, transfer):
+        """
+        Account a transfer completion, and call hooks.
+        """
+        latency = time.perf_counter() - transfer.submit_time
+        address = transfer.getEndpoint()
+        status = transfer.getStatus()
+        if transfer.getType() == usb1.TRANSFER_TYPE_ISOCHRONOUS:
+            length = sum(p["actual_length"] for p in transfer.getISOSetupList())
+        else:
+            length = transfer.getActualLength()
+
+        self.endpoint(address).record(self.metrics.LATENCY_BOUNDS, status, length, latency)
+        for hook in self.metrics.hooks:
+            hook(self.key, address, STATUS_NAMES.get(status, str(status)), length, latency)
+
+    def callback_wrap(self, callback):
+        """
+        Wrap a transfer completion callback for completion to be
+        accounted first.
+        """
+        def on_done(transfer):
+            try:
+                self.completed(transfer)
+            finally:
+                callback(transfer)
+        return on_done
+
+    def snapshot(self):
+        """
+        Get counters as a dict, by endpoint address as an hex string
+        ("0x81").
+        """
+        bounds = self.metrics.LATENCY_BOUNDS
+        return {"0x%02x" % address: ep.snapshot(bounds)
+                for address, ep in self.endpoints.items()}
+
+class Metrics:
+    """
+    Transfer metrics registry of a context, enabled with
+    Context(metrics = True). Counters are kept per device, by device
+    key (bus, ports, address), then per endpoint address.
+
+    Hooks are called on every transfer completion with (device_key,
+    endpoint_address, status, length, latency) arguments.
+    """
+
+    LATENCY_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                      0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, hook = None):
+        self.devices = {}
+        self.hooks = [hook] if hook is not None else []
+
+    def device(self, key):
+        """
+        Get counters for a device, creating them if needed.
+        """
+        device = self.devices.get(key)
+        if device is None:
+            device = self.devices[key] = DeviceMetrics(self, key)
+        return device
+
+    def snapshot(self):
+        """
+        Get all counters as a dict, by device name (see device_name()).
+        Only holds strings, numbers and dicts, it can be dumped as JSON
+        or exported as labels as is.
+        """
+        return {device_name(key): device.snapshot() for key, device in self.devices.items()}
+
+    def clear(self):
+        """
+        Reset all counters.
+        """
+        for device in self.devices.values():
+            device.endpoints.clear()
@@ -0,0 +1,1120 @@
+"""
+In-process simulated USB host, usable as a Context backend for
+testing and benchmarking without hardware::
+
+  host = sim.Host()
+  root = host.bus(1)
+  root.attach(1, sim.Device(0x1234, 0x5678, product = "Sim",
+                            endpoints = [sim.Endpoint(0x81, "bulk", 512)]))
+  ctx = ausb.Context(loop, backend = host.USBContext)
+
+Simulated objects mimic the subset of usb1 API ausb relies on
+(USBContext, USBDevice and descriptors, USBDeviceHandle, USBTransfer).
+
+Each endpoint has a latency and a bandwidth. Transfers on an endpoint
+are serialized by bandwidth, latency overlaps, so pipelining pays off
+as it does on a real bus. Transfers complete on a scheduler thread
+that wakes event handling up through a pipe, like the kernel does
+through libusb FDs. Device-side behavior (data sources and sinks,
+control requests) always runs from event handling.
+"""
+
+import collections
+import functools
+import heapq
+import os
+import select
+import struct
+import threading
+import time
+import usb1
+from select import POLLIN
+
+__all__ = ["Stall", "Endpoint", "Setting", "Interface", "Configuration",
+           "Device", "Hub", "FxBootloader", "Host"]
+
+class Stall(Exception):
+    """
+    Raised by device-side handlers to stall a request.
+    """
+    pass
+
+class Endpoint:
+    """
+    Simulated endpoint.
+
+    IN endpoints get data from source, called with requested length.
+    It returns at most that many bytes, or None for NAK (request is
+    retried after nak_interval seconds). OUT endpoints pass data to
+    sink. Both may raise Stall. Default source returns zeros, default
+    sink drops data.
+    """
+    TYPES = {"control": 0, "isochronous": 1, "bulk": 2, "interrupt": 3}
+
+    def __init__(self, address, type = "bulk", max_packet_size = 512, interval = 0,
+                 latency = 0.000125, bandwidth = None, source = None, sink = None,
+                 nak_interval = 0.001):
+        """
+        :param latency: Time from end of data phase to completion, seconds
+        :param bandwidth: Bytes per second, None for unlimited
+        """
+        self.address = address
+        self.type = type
+        self.max_packet_size = max_packet_size
+        self.interval = interval
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.source = source or bytes
+        self.sink = sink or (lambda data: None)
+        self.nak_interval = nak_interval
+        self.busy_until = 0.0
+
+    def _deadline(self, length):
+        """
+        Completion time of a transfer of given length submitted now.
+        """
+        start = max(time.monotonic(), self.busy_until)
+        self.busy_until = start + (length / self.bandwidth if self.bandwidth else 0)
+        return self.busy_until + self.latency
+
+    def getAddress(self):
+        return self.address
+
+    def getAttributes(self):
+        return self.TYPES[self.type]
+
+    def getMaxPacketSize(self):
+        return self.max_packet_size
+
+    def getInterval(self):
+        return self.interval
+
+    def getRefresh(self):
+        return 0
+
+    def getSyncAddress(self):
+        return 0
+
+    def getExtra(self):
+        return []
+
+class Setting:
+    """
+    Simulated alternate setting.
+    """
+    def __init__(self, alternate = 0, classes = (0xff, 0), protocol = 0,
+                 endpoints = (), string = 0):
+        self.number = 0
+        self.alternate = alternate
+        self.classes = classes
+        self.protocol = protocol
+        self.endpoints = list(endpoints)
+        self.string = string
+
+    def __iter__(self):
+        return iter(self.endpoints)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def __getitem__(self, index):
+        return self.endpoints[index]
+
+    def getNumber(self):
+        return self.number
+
+    def getAlternateSetting(self):
+        return self.alternate
+
+    def getNumEndpoints(self):
+        return len(self.endpoints)
+
+    def getClass(self):
+        return self.classes[0]
+
+    def getSubClass(self):
+        return self.classes[1]
+
+    def getClassTuple(self):
+        return self.classes
+
+    def getProtocol(self):
+        return self.protocol
+
+    def getDescriptor(self):
+        return self.string
+
+    def getExtra(self):
+        return []
+
+class Interface:
+    """
+    Simulated interface, a list of alternate settings.
+    """
+    def __init__(self, settings):
+        self.settings = list(settings)
+
+    def __iter__(self):
+        return iter(self.settings)
+
+    def __len__(self):
+        return len(self.settings)
+
+    def __getitem__(self, index):
+        return self.settings[index]
+
+    def getNumSettings(self):
+        return len(self.settings)
+
+class Configuration:
+    """
+    Simulated configuration, a list of interfaces.
+    """
+    def __init__(self, value = 1, interfaces = (), string = 0):
+        self.value = value
+        self.interfaces = list(interfaces)
+        self.string = string
+        for number, interface in enumerate(self.interfaces):
+            for setting in interface:
+                setting.number = number
+
+    def __iter__(self):
+        return iter(self.interfaces)
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    def __getitem__(self, index):
+        return self.interfaces[index]
+
+    def getConfigurationValue(self):
+        return self.value
+
+    def getNumInterfaces(self):
+        return len(self.interfaces)
+
+    def getDescriptor(self):
+        return self.string
+
+    def getAttributes(self):
+        return 0x80
+
+    def getMaxPower(self):
+        return 100
+
+    def getExtra(self):
+        return []
+
+class Device:
+    """
+    Simulated device. Without configurations, a single configuration
+    with a single interface holding endpoints is created.
+
+    Standard requests are handled for device descriptor, strings and
+    configuration. Other control requests are passed to handler, called
+    with (request_type, request, value, index, data_or_length). For IN
+    requests, it returns data, it may raise Stall.
+    """
+    def __init__(self, vendor_id, product_id, manufacturer = None, product = None,
+                 serial = None, classes = (0, 0), protocol = 0, usb_version = 0x200,
+                 device_version = 0x100, speed = usb1.SPEED_HIGH, max_packet_size0 = 64,
+                 endpoints = (), configurations = None, handler = None,
+                 latency = 0.000125, bandwidth = None):
+        """
+        :param latency: Control request latency, seconds
+        :param bandwidth: Control pipe bandwidth, bytes per second
+        """
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.classes = classes
+        self.protocol = protocol
+        self.usb_version = usb_version
+        self.device_version = device_version
+        self.speed = speed
+        self.max_packet_size0 = max_packet_size0
+        self.handler = handler
+        self.ep0 = Endpoint(0, "control", max_packet_size0,
+                            latency = latency, bandwidth = bandwidth)
+
+        self.strings = {}
+        self.string_indexes = []
+        for s in (manufacturer, product, serial):
+            if s is None:
+                self.string_indexes.append(0)
+            else:
+                self.string_indexes.append(len(self.strings) + 1)
+                self.strings[len(self.strings) + 1] = s
+
+        if configurations is None:
+            configurations = [Configuration(1, [Interface([Setting(endpoints = endpoints)])])]
+        self.configurations = list(configurations)
+
+        self.host = None
+        self.hub = None
+        self.bus = None
+        self.ports = None
+        self.address = None
+        self.configuration = 0
+        self.alternates = {}
+
+    def __str__(self):
+        return "Bus %03d Device %03d: ID %04x:%04x" % (
+            self.bus or 0, self.address or 0, self.vendor_id, self.product_id)
+
+    def __len__(self):
+        return len(self.configurations)
+
+    def __getitem__(self, index):
+        return self.configurations[index]
+
+    def __iter__(self):
+        return iter(self.configurations)
+
+    @property
+    def attached(self):
+        return self.host is not None
+
+    def _attach(self, host, hub, bus, ports):
+        self.host = host
+        self.hub = hub
+        self.bus = bus
+        self.ports = ports
+        self.address = host._address_allocate(bus)
+        self.configuration = self.configurations[0].value if self.configurations else 0
+        self.alternates = {}
+
+    def _detach(self):
+        self.host = None
+        self.hub = None
+
+    def endpoint(self, address):
+        """
+        Get endpoint by address in current configuration and alternate
+        settings, or None.
+        """
+        if address & 0x7f == 0:
+            return self.ep0
+        for configuration in self.configurations:
+            if configuration.value != self.configuration:
+                continue
+            for number, interface in enumerate(configuration):
+                for endpoint in interface[self.alternates.get(number, 0)]:
+                    if endpoint.address == address:
+                        return endpoint
+        return None
+
+    def string(self, index):
+        return self.strings.get(index)
+
+    def descriptor(self):
+        """
+        Device descriptor, as bytes.
+        """
+        return struct.pack("<BBHBBBBHHHBBBB", 18, 1, self.usb_version,
+                           self.classes[0], self.classes[1], self.protocol,
+                           self.max_packet_size0, self.vendor_id, self.product_id,
+                           self.device_version, *self.string_indexes,
+                           len(self.configurations))
+
+    def control(self, request_type, request, value, index, data_or_length):
+        """
+        Handle a control request, device side.
+
+        :returns: Data for IN requests
+        """
+        if request_type & 0x60 != 0:
+            if self.handler is None:
+                raise Stall()
+            return self.handler(request_type, request, value, index, data_or_length)
+
+        if request == 6:
+            kind, number = value >> 8, value & 0xff
+            if kind == 1:
+                return self.descriptor()
+            if kind == 3 and number == 0:
+                return b"\x04\x03\x09\x04" if self.strings else b"\x02\x03"
+            if kind == 3 and number in self.strings:
+                s = self.strings[number].encode("utf-16-le")
+                return bytes([len(s) + 2, 3]) + s
+            raise Stall()
+        elif request == 8:
+            return bytes([self.configuration])
+        elif request == 9:
+            self.configuration = value
+        elif request == 11:
+            self.alternates[index] = value
+        elif request == 0:
+            return b"\x00\x00"
+        elif request not in (1, 3):
+            raise Stall()
+
+    # usb1.USBDevice API
+
+    def getBusNumber(self):
+        return self.bus
+
+    def getPortNumber(self):
+        return self.ports[-1] if self.ports else 0
+
+    def getPortNumberList(self):
+        return list(self.ports)
+
+    def getDeviceAddress(self):
+        return self.address
+
+    def getbcdUSB(self):
+        return self.usb_version
+
+    def getDeviceClass(self):
+        return self.classes[0]
+
+    def getDeviceSubClass(self):
+        return self.classes[1]
+
+    def getDeviceProtocol(self):
+        return self.protocol
+
+    def getDeviceSpeed(self):
+        return self.speed
+
+    def getMaxPacketSize0(self):
+        return self.max_packet_size0
+
+    def getVendorID(self):
+        return self.vendor_id
+
+    def getProductID(self):
+        return self.product_id
+
+    def getbcdDevice(self):
+        return self.device_version
+
+    def getNumConfigurations(self):
+        return len(self.configurations)
+
+    def iterConfigurations(self):
+        return iter(self.configurations)
+
+    def getManufacturerDescriptor(self):
+        return self.string_indexes[0]
+
+    def getProductDescriptor(self):
+        return self.string_indexes[1]
+
+    def getSerialNumberDescriptor(self):
+        return self.string_indexes[2]
+
+    def getSupportedLanguageList(self):
+        return [0x0409] if self.strings else []
+
+    def getManufacturer(self):
+        return self.string(self.string_indexes[0])
+
+    def getProduct(self):
+        return self.string(self.string_indexes[1])
+
+    def getSerialNumber(self):
+        return self.string(self.string_indexes[2])
+
+    def _open(self, scheduler):
+        if not self.attached:
+            raise usb1.USBErrorNoDevice()
+        return DeviceHandle(self, scheduler)
+
+class Hub(Device):
+    """
+    Simulated USB 2.0 hub. Port status and change bits follow
+    attachments, status change endpoint reports changed ports.
+    """
+    def __init__(self, vendor_id = 0x1d6b, product_id = 0x0002, port_count = 4, **kwargs):
+        self.port_count = port_count
+        self.children = {}
+        self.changes = [0] * (port_count + 1)
+        self.enabled = [False] * (port_count + 1)
+        status = Endpoint(0x81, "interrupt", (port_count + 8) // 8, interval = 12,
+                          source = self._status_change)
+        kwargs.setdefault("endpoints", [status])
+        kwargs.setdefault("classes", (9, 0))
+        super().__init__(vendor_id, product_id, **kwargs)
+
+    def attach(self, port, device):
+        """
+        Plug a device on a port.
+
+        :returns: device
+        """
+        if not 1 <= port <= self.port_count:
+            raise ValueError("No such port")
+        if port in self.children:
+            raise ValueError("Port already used")
+        self.children[port] = device
+        self.changes[port] |= 0x0001
+        self.enabled[port] = True
+        if self.attached:
+            device._attach(self.host, self, self.bus, self.ports + [port])
+        return device
+
+    def detach(self, port):
+        """
+        Unplug device from a port.
+
+        :returns: Device that was plugged
+        """
+        device = self.children.pop(port)
+        self.changes[port] |= 0x0001
+        self.enabled[port] = False
+        device._detach()
+        return device
+
+    def _attach(self, host, hub, bus, ports):
+        super()._attach(host, hub, bus, ports)
+        for port, device in self.children.items():
+            device._attach(host, self, bus, ports + [port])
+
+    def _detach(self):
+        super()._detach()
+        for device in self.children.values():
+            device._detach()
+
+    def devices(self):
+        """
+        Iterate over devices in this subtree, hub included.
+        """
+        yield self
+        for port in sorted(self.children):
+            device = self.children[port]
+            if isinstance(device, Hub):
+                yield from device.devices()
+            else:
+                yield device
+
+    def _status_change(self, length):
+        bitmap = 0
+        for port in range(1, self.port_count + 1):
+            if self.changes[port]:
+                bitmap |= 1 << port
+        if not bitmap:
+            return None
+        return bitmap.to_bytes(length, "little")
+
+    def _port_status(self, port):
+        device = self.children.get(port)
+        status = 0x0100
+        if device is not None:
+            status |= 0x0001
+            if self.enabled[port]:
+                status |= 0x0002
+            if device.speed == usb1.SPEED_LOW:
+                status |= 0x0200
+            elif device.speed >= usb1.SPEED_HIGH:
+                status |= 0x0400
+        return struct.pack("<HH", status, self.changes[port])
+
+    def control(self, request_type, request, value, index, data_or_length):
+        if request_type & 0x60 != 0x20:
+            return super().control(request_type, request, value, index, data_or_length)
+
+        recipient = request_type & 0x1f
+        if recipient == 0:
+            if request == 6 and value >> 8 == 0x29:
+                removable = (self.port_count + 8) // 8
+                return bytes([7 + 2 * removable, 0x29, self.port_count, 0, 0, 50, 0]) \
+                    + bytes(removable) + b"\xff" * removable
+            if request == 0:
+                return b"\x00\x00\x00\x00"
+            if request in (1, 3):
+                return None
+            raise Stall()
+
+        if not 1 <= index <= self.port_count:
+            raise Stall()
+        if request == 0:
+            return self._port_status(index)
+        if request == 1:
+            if 16 <= value <= 20:
+                self.changes[index] &= ~(1 << (value - 16))
+            elif value == 1:
+                self.enabled[index] = False
+            return None
+        if request == 3:
+            if value == 4:
+                self.enabled[index] = index in self.children
+                self.changes[index] |= 0x0010
+            return None
+        raise Stall()
+
+class FxBootloader(Device):
+    """
+    Simulated Cypress FX2/FX3 bootloader. Vendor request 0xa0 reads
+    and writes RAM. Firmware starts on FX3 jump (zero-length write), or
+    on FX2 CPUCS register releasing 8051 from reset. If a firmware
+    device is given, bootloader then re-enumerates as it.
+    """
+    PAGE = 4096
+
+    def __init__(self, vendor_id = 0x04b4, product_id = 0x00f3, firmware = None, **kwargs):
+        super().__init__(vendor_id, product_id, **kwargs)
+        self.firmware = firmware
+        self.memory = {}
+        self.cpu_reset = True
+        self.entry_point = None
+
+    def __pages(self, addr, length):
+        """
+        Split a memory range by page, yields (page, start, offset, size).
+        """
+        offset = 0
+        while offset < length:
+            page, start = divmod(addr + offset, self.PAGE)
+            size = min(self.PAGE - start, length - offset)
+            yield page, start, offset, size
+            offset += size
+
+    def memory_write(self, addr, data):
+        for page, start, offset, size in self.__pages(addr, len(data)):
+            buffer = self.memory.setdefault(page, bytearray(self.PAGE))
+            buffer[start : start + size] = data[offset : offset + size]
+
+    def memory_read(self, addr, length):
+        data = bytearray(length)
+        for page, start, offset, size in self.__pages(addr, length):
+            buffer = self.memory.get(page)
+            if buffer is not None:
+                data[offset : offset + size] = buffer[start : start + size]
+        return bytes(data)
+
+    def control(self, request_type, request, value, index, data_or_length):
+        if request_type & 0x60 != 0x40 or request != 0xa0:
+            return super().control(request_type, request, value, index, data_or_length)
+
+        addr = value | (index << 16)
+        if isinstance(data_or_length, int):
+            return self.memory_read(addr, data_or_length)
+
+        if not data_or_length:
+            self._start(addr)
+            return None
+
+        self.memory_write(addr, data_or_length)
+        if addr == 0xe600:
+            reset = bool(data_or_length[0] & 1)
+            if self.cpu_reset and not reset:
+                self._start(0)
+            self.cpu_reset = reset
+
+    def _start(self, entry_point):
+        self.entry_point = entry_point
+        if self.firmware is not None and self.hub is not None:
+            hub = self.hub
+            port = self.ports[-1]
+            hub.detach(port)
+            hub.attach(port, self.firmware)
+
+class Transfer:
+    """
+    Simulated usb1.USBTransfer.
+    """
+    def __init__(self, handle, iso_packets = 0):
+        self.__handle = handle
+        self.__iso_packets = iso_packets
+        self.__type = None
+        self.__endpoint = 0
+        self.__setup = None
+        self.__buffer = bytearray()
+        self.__iso = []
+        self.__callback = None
+        self.__user_data = None
+        self.__timeout = 0
+        self.__status = usb1.TRANSFER_COMPLETED
+        self.__actual_length = 0
+        self.__submitted = False
+        self.__token = None
+
+    @staticmethod
+    def _buffer(buffer_or_len):
+        if isinstance(buffer_or_len, int):
+            return bytearray(buffer_or_len)
+        view = memoryview(buffer_or_len)
+        if view.readonly:
+            return bytearray(view)
+        return view.cast("B")
+
+    def __set(self, type, endpoint, buffer_or_len, callback, user_data, timeout):
+        if self.__submitted:
+            raise ValueError("Cannot alter a submitted transfer")
+        self.__type = type
+        self.__endpoint = endpoint
+        self.__buffer = self._buffer(buffer_or_len)
+        self.__callback = callback
+        self.__user_data = user_data
+        self.__timeout = timeout
+
+    def setControl(self, request_type, request, value, index, buffer_or_len,
+                   callback = None, user_data = None, timeout = 0):
+        self.__set(usb1.TRANSFER_TYPE_CONTROL, 0, buffer_or_len, callback, user_data, timeout)
+        self.__setup = (request_type, request, value, index)
+
+    def setBulk(self, endpoint, buffer_or_len, callback = None, user_data = None, timeout = 0):
+        self.__set(usb1.TRANSFER_TYPE_BULK, endpoint, buffer_or_len, callback, user_data, timeout)
+
+    def setInterrupt(self, endpoint, buffer_or_len, callback = None, user_data = None, timeout = 0):
+        self.__set(usb1.TRANSFER_TYPE_INTERRUPT, endpoint, buffer_or_len, callback, user_data, timeout)
+
+    def setIsochronous(self, endpoint, buffer_or_len, callback = None, user_data = None,
+                       timeout = 0, iso_transfer_length_list = None):
+        self.__set(usb1.TRANSFER_TYPE_ISOCHRONOUS, endpoint, buffer_or_len,
+                   callback, user_data, timeout)
+        if iso_transfer_length_list is None:
+            size = len(self.__buffer) // self.__iso_packets
+            iso_transfer_length_list = [size] * self.__iso_packets
+        if len(iso_transfer_length_list) > self.__iso_packets:
+            raise ValueError("Too many ISO packets")
+        self.__iso = [{"length": l, "actual_length": 0, "status": 0}
+                      for l in iso_transfer_length_list]
+
+    def setBuffer(self, buffer_or_len):
+        if self.__submitted:
+            raise ValueError("Cannot alter a submitted transfer")
+        if self.__type == usb1.TRANSFER_TYPE_CONTROL:
+            raise ValueError("To alter control transfer buffer, use setControl")
+        self.__buffer = self._buffer(buffer_or_len)
+
+    def setCallback(self, callback):
+        self.__callback = callback
+
+    def getCallback(self):
+        return self.__callback
+
+    def getType(self):
+        return self.__type
+
+    def getEndpoint(self):
+        return self.__endpoint
+
+    def getStatus(self):
+        return self.__status
+
+    def getActualLength(self):
+        return self.__actual_length
+
+    def getBuffer(self):
+        return self.__buffer
+
+    def getUserData(self):
+        return self.__user_data
+
+    def getISOSetupList(self):
+        return [dict(p) for p in self.__iso]
+
+    def getISOBufferList(self):
+        buffers = []
+        offset = 0
+        for p in self.__iso:
+            buffers.append(self.__buffer[offset : offset + p["length"]])
+            offset += p["length"]
+        return buffers
+
+    def isSubmitted(self):
+        return self.__submitted
+
+    def submit(self):
+        if self.__submitted:
+            raise usb1.USBErrorBusy()
+        handle = self.__handle
+        device = handle.device
+        if handle.closed or not device.attached:
+            raise usb1.USBErrorNoDevice()
+        endpoint = device.endpoint(self.__endpoint)
+        if endpoint is None:
+            raise usb1.USBErrorNotFound()
+
+        self.__submitted = True
+        token = self.__token = object()
+        scheduler = handle.scheduler
+        scheduler.call_at(endpoint._deadline(len(self.__buffer)),
+                          functools.partial(self._run, token))
+        if self.__timeout:
+            scheduler.call_at(time.monotonic() + self.__timeout / 1000,
+                              functools.partial(self._expire, token))
+
+    def cancel(self):
+        if not self.__submitted or self.__token is None:
+            raise usb1.USBErrorNotFound()
+        self.__token = None
+        self.__handle.scheduler.call_soon(
+            functools.partial(self._complete, usb1.TRANSFER_CANCELLED, 0))
+
+    def close(self):
+        if self.__submitted:
+            raise ValueError("Cannot close a submitted transfer")
+
+    def _expire(self, token):
+        if token is self.__token:
+            self.__token = None
+            self._complete(usb1.TRANSFER_TIMED_OUT, 0)
+
+    def _run(self, token):
+        """
+        Run transfer device side, on event handling.
+        """
+        if token is not self.__token:
+            return
+
+        device = self.__handle.device
+        if not device.attached:
+            self.__token = None
+            self._complete(usb1.TRANSFER_NO_DEVICE, 0)
+            return
+
+        try:
+            length = self.__transact(device)
+        except Stall:
+            self.__token = None
+            self._complete(usb1.TRANSFER_STALL, 0)
+            return
+        except OverflowError:
+            self.__token = None
+            self._complete(usb1.TRANSFER_OVERFLOW, 0)
+            return
+
+        if length is None:
+            endpoint = device.endpoint(self.__endpoint)
+            self.__handle.scheduler.call_at(time.monotonic() + endpoint.nak_interval,
+                                            functools.partial(self._run, token))
+            return
+
+        self.__token = None
+        self._complete(usb1.TRANSFER_COMPLETED, length)
+
+    def __transact(self, device):
+        buffer = self.__buffer
+        if self.__type == usb1.TRANSFER_TYPE_CONTROL:
+            request_type, request, value, index = self.__setup
+            if request_type & usb1.ENDPOINT_IN:
+                data = device.control(request_type, request, value, index, len(buffer)) or b""
+                return self.__fill(buffer, 0, len(buffer), data, truncate = True)
+            device.control(request_type, request, value, index, bytes(buffer))
+            return len(buffer)
+
+        endpoint = device.endpoint(self.__endpoint)
+        if self.__type == usb1.TRANSFER_TYPE_ISOCHRONOUS:
+            offset = 0
+            for p in self.__iso:
+                if self.__endpoint & usb1.ENDPOINT_IN:
+                    data = endpoint.source(p["length"]) or b""
+                    p["actual_length"] = self.__fill(buffer, offset, p["length"], data,
+                                                     truncate = True)
+                else:
+                    endpoint.sink(bytes(buffer[offset : offset + p["length"]]))
+                    p["actual_length"] = p["length"]
+                p["status"] = 0
+                offset += p["length"]
+            return offset
+
+        if self.__endpoint & usb1.ENDPOINT_IN:
+            data = endpoint.source(len(buffer))
+            if data is None:
+                return None
+            return self.__fill(buffer, 0, len(buffer), data)
+        endpoint.sink(bytes(buffer))
+        return len(buffer)
+
+    @staticmethod
+    def __fill(buffer, offset, length, data, truncate = False):
+        if len(data) > length:
+            if not truncate:
+                raise OverflowError()
+            data = data[:length]
+        buffer[offset : offset + len(data)] = data
+        return len(data)
+
+    def _complete(self, status, length):
+        self.__submitted = False
+        self.__status = status
+        self.__actual_length = length
+        if self.__callback is not None:
+            self.__callback(self)
+
+class DeviceHandle:
+    """
+    Simulated usb1.USBDeviceHandle.
+    """
+    def __init__(self, device, scheduler):
+        self.device = device
+        self.scheduler = scheduler
+        self.closed = False
+        self.claimed = set()
+
+    def __check(self):
+        if self.closed or not self.device.attached:
+            raise usb1.USBErrorNoDevice()
+
+    def close(self):
+        self.closed = True
+
+    def getDevice(self):
+        return self.device
+
+    def getTransfer(self, iso_packets = 0, short_is_error = False, add_zero_packet = False):
+        return Transfer(self, iso_packets)
+
+    def getConfiguration(self):
+        self.__check()
+        return self.device.configuration
+
+    def setConfiguration(self, configuration):
+        self.__check()
+        self.device.configuration = configuration
+
+    def claimInterface(self, interface):
+        self.__check()
+        self.claimed.add(interface)
+
+    def releaseInterface(self, interface):
+        self.__check()
+        self.claimed.discard(interface)
+
+    def setInterfaceAltSetting(self, interface, alt_setting):
+        self.__check()
+        self.device.alternates[interface] = alt_setting
+
+    def clearHalt(self, endpoint):
+        self.__check()
+
+    def resetDevice(self):
+        self.__check()
+        self.device.alternates = {}
+
+    def kernelDriverActive(self, interface):
+        return False
+
+    def detachKernelDriver(self, interface):
+        pass
+
+    def attachKernelDriver(self, interface):
+        pass
+
+    def getSupportedLanguageList(self):
+        self.__check()
+        return self.device.getSupportedLanguageList()
+
+    def getStringDescriptor(self, descriptor, lang_id, errors = "strict"):
+        self.__check()
+        return self.device.string(descriptor)
+
+    def getASCIIStringDescriptor(self, descriptor, errors = "strict"):
+        self.__check()
+        return self.device.string(descriptor)
+
+    def getManufacturer(self):
+        return self.getASCIIStringDescriptor(self.device.string_indexes[0])
+
+    def getProduct(self):
+        return self.getASCIIStringDescriptor(self.device.string_indexes[1])
+
+    def getSerialNumber(self):
+        return self.getASCIIStringDescriptor(self.device.string_indexes[2])
+
+class Scheduler:
+    """
+    Completion scheduler of a simulated context. A thread moves
+    callables to the due queue when their time comes, and wakes event
+    handling up by writing to a pipe. Callables are run from event
+    handling.
+    """
+    def __init__(self):
+        self.fd, self.__wakeup = os.pipe()
+        os.set_blocking(self.fd, False)
+        self.__timers = []
+        self.__due = collections.deque()
+        self.__seq = 0
+        self.__cond = threading.Condition()
+        self.__closed = False
+        self.__thread = threading.Thread(target = self._work, name = "ausb-sim", daemon = True)
+        self.__thread.start()
+
+    def close(self):
+        with self.__cond:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__cond.notify()
+        self.__thread.join()
+        os.close(self.fd)
+        os.close(self.__wakeup)
+
+    def call_at(self, when, callback):
+        with self.__cond:
+            self.__seq += 1
+            heapq.heappush(self.__timers, (when, self.__seq, callback))
+            if self.__timers[0][2] is callback:
+                self.__cond.notify()
+
+    def call_soon(self, callback):
+        with self.__cond:
+            self.__due.append(callback)
+            if len(self.__due) == 1:
+                self.wakeup()
+
+    def wakeup(self):
+        try:
+            os.write(self.__wakeup, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _work(self):
+        with self.__cond:
+            while not self.__closed:
+                now = time.monotonic()
+                timers = self.__timers
+                if timers and timers[0][0] <= now:
+                    empty = not self.__due
+                    while timers and timers[0][0] <= now:
+                        self.__due.append(heapq.heappop(timers)[2])
+                    if empty:
+                        self.wakeup()
+                elif timers:
+                    self.__cond.wait(timers[0][0] - now)
+                else:
+                    self.__cond.wait()
+
+    def run(self):
+        """
+        Run due callables, without blocking.
+        """
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self.__cond:
+            due, self.__due = self.__due, collections.deque()
+        for callback in due:
+            callback()
+
+class DeviceRef:
+    """
+    Device as enumerated from a context, like usb1.USBDevice. Handles
+    opened from it complete transfers on that context.
+    """
+    def __init__(self, context, device):
+        self.__context = context
+        self.device = device
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def __str__(self):
+        return str(self.device)
+
+    def __len__(self):
+        return len(self.device)
+
+    def __getitem__(self, index):
+        return self.device[index]
+
+    def __iter__(self):
+        return iter(self.device)
+
+    def __hash__(self):
+        return hash(self.device)
+
+    def __eq__(self, other):
+        return self.device is getattr(other, "device", None)
+
+    def open(self):
+        return self.device._open(self.__context.scheduler)
+
+class Context:
+    """
+    Simulated usb1.USBContext. Should be spawned by Host.USBContext().
+    """
+    def __init__(self, host):
+        self.host = host
+        self.scheduler = Scheduler()
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.scheduler.close()
+
+    def getDeviceIterator(self, skip_on_error = False):
+        return iter(self.getDeviceList(skip_on_error))
+
+    def getDeviceList(self, skip_on_error = False):
+        return [DeviceRef(self, device) for device in self.host.devices()]
+
+    def setPollFDNotifiers(self, added_cb = None, removed_cb = None, user_data = None):
+        pass
+
+    def getPollFDList(self):
+        return [(self.scheduler.fd, POLLIN)]
+
+    def getNextTimeout(self):
+        return None
+
+    def handleEventsTimeout(self, tv = 0):
+        if self.closed:
+            return
+        if tv != 0:
+            select.select([self.scheduler.fd], [], [], tv)
+        self.scheduler.run()
+
+    def handleEvents(self):
+        self.handleEventsTimeout(None)
+
+    def interruptEventHandler(self):
+        if not self.closed:
+            self.scheduler.wakeup()
+
+    def hasCapability(self, capability):
+        return False
+
+    def hotplugRegisterCallback(self, *args, **kwargs):
+        raise usb1.USBErrorNotSupported()
+
+class Host:
+    """
+    Simulated host, owning buses. Each bus has a root hub where devices
+    and hubs get plugged.
+    """
+    def __init__(self):
+        self.__buses = {}
+        self.__addresses = {}
+
+    def bus(self, number = 1, port_count = 4):
+        """
+        Get root hub of a bus, creating bus if needed.
+        """
+        root = self.__buses.get(number)
+        if root is None:
+            root = self.__buses[number] = Hub(port_count = port_count)
+            root._attach(self, None, number, [])
+        return root
+
+    def devices(self):
+        """
+        Iterate over all attached devices.
+        """
+        for number in sorted(self.__buses):
+            yield from self.__buses[number].devices()
+
+    def _address_allocate(self, bus):
+        address = self.__addresses.get(bus, 0) % 127 + 1
+        self.__addresses[bus] = address
+        return address
+
+    def USBContext(self):
+        """
+        Create a context on this host. This is a Context backend factory.
+        """
+        return Context(self)
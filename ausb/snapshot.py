@@ -0,0 +1,279 @@
+import time
+
+__all__ = ["Snapshot", "Index"]
+
+class Endpoint:
+    """
+    Endpoint descriptor snapshot.
+    """
+    __slots__ = ("address", "attributes", "max_packet_size", "interval")
+
+    def __init__(self, endpoint):
+        self.address = endpoint.getAddress()
+        self.attributes = endpoint.getAttributes()
+        self.max_packet_size = endpoint.getMaxPacketSize()
+        self.interval = endpoint.getInterval()
+
+    @property
+    def type(self):
+        """
+        Endpoint type, either "control", "isochronous", "bulk" or "interrupt"
+        """
+        return ["control", "isochronous", "bulk", "interrupt"][self.attributes & 0x3]
+
+    @property
+    def direction(self):
+        """
+        Endpoint direction, either "in" or "out"
+        """
+        return "in" if self.address & 0x80 else "out"
+
+class Setting:
+    """
+    Alternate setting descriptor snapshot.
+    """
+    __slots__ = ("number", "alternate", "classes", "protocol", "endpoints")
+
+    def __init__(self, setting):
+        self.number = setting.getNumber()
+        self.alternate = setting.getAlternateSetting()
+        self.classes = (setting.getClass(), setting.getSubClass())
+        self.protocol = setting.getProtocol()
+        self.endpoints = tuple(Endpoint(e) for e in setting)
+
+    def __iter__(self):
+        return iter(self.endpoints)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+class Interface:
+    """
+    Interface descriptor snapshot.
+    """
+    __slots__ = ("settings",)
+
+    def __init__(self, interface):
+        self.settings = tuple(Setting(s) for s in interface)
+
+    def __iter__(self):
+        return iter(self.settings)
+
+    def __len__(self):
+        return len(self.settings)
+
+class Configuration:
+    """
+    Configuration descriptor snapshot.
+    """
+    __slots__ = ("number", "interfaces")
+
+    def __init__(self, configuration):
+        self.number = configuration.getConfigurationValue()
+        self.interfaces = tuple(Interface(i) for i in configuration)
+
+    def __iter__(self):
+        return iter(self.interfaces)
+
+    def __len__(self):
+        return len(self.interfaces)
+
+class Device:
+    """
+    Device descriptor snapshot. Attributes have the same meaning as
+    descriptor.Device properties, but are retrieved once and for all
+    when snapshot is taken.
+
+    String descriptors are not part of the snapshot, as retrieving
+    them requires opening the device. They are still available from
+    descriptor object, and cached in strings as they get fetched, by
+    (language, index). Language None stands for device's first
+    language, index 0 holds the language list.
+    """
+    __slots__ = ("descriptor", "key", "bus", "port", "ports", "address",
+                 "usb_version", "classes", "protocol", "max_packet_size0",
+                 "vendor_id", "product_id", "device_version", "speed",
+                 "configurations", "strings", "__weakref__")
+
+    def __init__(self, descriptor, key = None):
+        device = descriptor.device
+        self.descriptor = descriptor
+        self.key = key or device_key(device)
+        self.bus, self.ports, self.address = self.key
+        self.port = device.getPortNumber()
+        self.usb_version = device.getbcdUSB()
+        self.classes = (device.getDeviceClass(), device.getDeviceSubClass())
+        self.protocol = device.getDeviceProtocol()
+        self.speed = device.getDeviceSpeed()
+        mps0 = device.getMaxPacketSize0()
+        self.max_packet_size0 = 1 << mps0 if self.speed == 4 else mps0
+        self.vendor_id = device.getVendorID()
+        self.product_id = device.getProductID()
+        self.device_version = device.getbcdDevice()
+        self.configurations = tuple(Configuration(c) for c in device.iterConfigurations())
+        self.strings = {}
+
+    def __iter__(self):
+        return iter(self.configurations)
+
+    def __len__(self):
+        return len(self.configurations)
+
+    def match(self, criteria):
+        """
+        Check whether all criteria match. Criteria not part of snapshot
+        are matched against descriptor object.
+        """
+        for k, v in criteria.items():
+            if k in self.__slots__:
+                if k == "ports":
+                    v = tuple(v)
+                if getattr(self, k) != v:
+                    return False
+            elif getattr(self.descriptor, k) != v:
+                return False
+        return True
+
+def device_key(device):
+    """
+    Identity of an usb1 device on the bus: (bus, ports, address). A
+    device getting re-enumerated gets a new key.
+    """
+    return (device.getBusNumber(), tuple(device.getPortNumberList()),
+            device.getDeviceAddress())
+
+class Snapshot:
+    """
+    Immutable snapshot of all devices descriptor trees, taken for a
+    given context generation. Should be spawned by Context.snapshot().
+    """
+    __slots__ = ("generation", "timestamp", "devices")
+
+    def __init__(self, generation, devices):
+        self.generation = generation
+        self.timestamp = time.monotonic()
+        self.devices = tuple(devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+    def filter(self, **criteria):
+        """
+        Iterate over device snapshots matching all criteria.
+        """
+        for d in self.devices:
+            if d.match(criteria):
+                yield d
+
+class Index:
+    """
+    Hash indexes over device snapshots, by topology path, by vendor
+    and product IDs and by serial number. Indexes are updated
+    incrementally as devices come and go. This is an implementation
+    detail of Context (i.e. no API stability).
+
+    Serial numbers can only be retrieved by opening devices, they are
+    fetched on first lookup by serial, then only for new devices.
+    """
+    def __init__(self):
+        self.devices = {}
+        self.by_path = {}
+        self.by_id = {}
+        self.by_serial = None
+        self.serials = {}
+
+    def add(self, device):
+        """
+        Add a device snapshot to indexes.
+        """
+        self.devices[device.key] = device
+        self.by_path[(device.bus, device.ports)] = device
+        self.by_id.setdefault((device.vendor_id, device.product_id), []).append(device)
+        if self.by_serial is not None:
+            self._serial_add(device)
+
+    def remove(self, key):
+        """
+        Remove a device snapshot from indexes, by its key.
+        """
+        device = self.devices.pop(key, None)
+        if device is None:
+            return
+        if self.by_path.get((device.bus, device.ports)) is device:
+            del self.by_path[(device.bus, device.ports)]
+        self._list_remove(self.by_id, (device.vendor_id, device.product_id), device)
+        serial = self.serials.pop(key, None)
+        if self.by_serial is not None and serial is not None:
+            self._list_remove(self.by_serial, serial, device)
+
+    @staticmethod
+    def _list_remove(index, key, device):
+        devices = index.get(key)
+        if devices is None:
+            return
+        devices.remove(device)
+        if not devices:
+            del index[key]
+
+    def _serial_add(self, device):
+        try:
+            serial = device.descriptor.serial
+        except Exception:
+            serial = None
+        self.serials[device.key] = serial
+        if serial is not None:
+            self.by_serial.setdefault(serial, []).append(device)
+
+    def update(self, descriptors):
+        """
+        Update indexes from a full device enumeration. Snapshots of
+        devices already known are kept as is, only new devices get
+        their descriptor tree read.
+
+        :param descriptors: Iterable of descriptor.Device
+        :returns: Tuple of device snapshots, in enumeration order
+        """
+        devices = []
+        seen = set()
+        for d in descriptors:
+            key = device_key(d.device)
+            device = self.devices.get(key)
+            if device is None:
+                device = Device(d, key)
+                self.add(device)
+            seen.add(key)
+            devices.append(device)
+
+        for key in [k for k in self.devices if k not in seen]:
+            self.remove(key)
+
+        return tuple(devices)
+
+    def candidates(self, criteria):
+        """
+        Get devices that may match criteria using an index, if any
+        applies.
+
+        :returns: A (devices, matched) couple, where matched is the set
+          of criteria names the index already checked, or None if no
+          index applies.
+        """
+        if "bus" in criteria and "ports" in criteria:
+            device = self.by_path.get((criteria["bus"], tuple(criteria["ports"])))
+            return (device,) if device is not None else (), {"bus", "ports"}
+
+        if "vendor_id" in criteria and "product_id" in criteria:
+            devices = self.by_id.get((criteria["vendor_id"], criteria["product_id"]), ())
+            return tuple(devices), {"vendor_id", "product_id"}
+
+        if "serial" in criteria:
+            if self.by_serial is None:
+                self.by_serial = {}
+                for device in self.devices.values():
+                    self._serial_add(device)
+            return tuple(self.by_serial.get(criteria["serial"], ())), {"serial"}
+
+        return None
@@ -10,8 +10,13 @@ async def fx3_load(loop, bus, address, firmware_filename):
     dd = c.device_get(bus = bus, address = address)
     device = dd.open()
     fx3 = fx.Fx3(device)
-    firmware = fx.FirmwareImage.from_file(firmware_filename)
-    await fx3.firmware_load(firmware)
+    firmware = fx.firmware_cache.load(firmware_filename)
+
+    def progress(done, total):
+        print("\rUploading %3d%%" % (done * 100 // total), end = "", flush = True)
+
+    stats = await fx3.firmware_load(firmware, progress = progress)
+    print("\rUploaded %s" % stats)
 
 def stopper(signame, loop):
     for task in asyncio.Task.all_tasks():
@@ -0,0 +1,42 @@
+from .. import *
+import asyncio
+import sys
+import signal
+import time
+from ..util import fx
+import functools
+
+async def fx3_load_all(loop, vid, pid, firmware_filename, per_bus):
+    c = Context(loop)
+    devices = list(c.device_filter(vendor_id = vid, product_id = pid))
+    firmware = fx.firmware_cache.load(firmware_filename)
+
+    print("Loading %d devices" % len(devices))
+    start = time.monotonic()
+    results = await fx.firmware_load_all(c, firmware, devices, per_bus = per_bus)
+
+    for result in results:
+        print(result)
+
+    failed = sum(1 for r in results if r.error is not None)
+    print("%d loaded, %d failed in %.3fs" % (
+        len(results) - failed, failed, time.monotonic() - start))
+    return failed
+
+def stopper(signame, loop):
+    for task in asyncio.all_tasks(loop):
+        task.cancel()
+
+if __name__ == "__main__":
+    loop = asyncio.get_event_loop()
+
+    for signame in ('SIGINT', 'SIGTERM'):
+        loop.add_signal_handler(getattr(signal, signame),
+                                functools.partial(stopper, signame, loop))
+
+    t = loop.create_task(fx3_load_all(loop,
+                                      int(sys.argv[1], 16),
+                                      int(sys.argv[2], 16),
+                                      sys.argv[3],
+                                      int(sys.argv[4]) if len(sys.argv) > 4 else 4))
+    sys.exit(1 if loop.run_until_complete(t) else 0)
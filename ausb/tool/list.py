@@ -1,18 +1,22 @@
 from .. import *
 import asyncio
 
+async def device_strings(d):
+    try:
+        strings = await d.strings_get([d.manufacturer_index, d.product_index])
+    except:
+        strings = {}
+    return (strings.get(d.manufacturer_index, ""),
+            strings.get(d.product_index, ""))
+
 async def ausb_list(loop):
     c = Context(loop)
-    for d in c:
-        try:
-            product = d.product
-            manufacturer = d.manufacturer
-        except:
-            product = ""
-            manufacturer = ""
+    devices = list(c)
+    strings = await asyncio.gather(*(device_strings(d) for d in devices))
+    for d, (manufacturer, product) in zip(devices, strings):
         print("Bus %03d Device %03d: ID %04x:%04x %s %s" % (
             d.bus, d.address, d.vendor_id, d.product_id, manufacturer, product))
-    
+
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
     t = loop.create_task(ausb_list(loop))
@@ -1,58 +1,118 @@
 from .. import *
-import usb1
 import asyncio
+import sys
 from ..util.hub import *
 
-async def device_dump(device):
+async def device_probe(limit, device):
+    """
+    Probe a device and get its lines of output, not including its
+    children. Output for hub ports is returned separately.
+
+    :returns: A (lines, ports) couple, where ports is a list of (port,
+      line) for hubs, or empty.
+    """
     pfx = "    " * len(device.ports)
-    
-    try:
-        handle = device.open()
-    except:
-        return
 
+    async with limit:
+        d = device.descriptor
+        try:
+            handle = await d.open_async()
+        except:
+            return [], []
+
+        try:
+            return await handle_probe(handle, device, pfx)
+        finally:
+            handle.close()
+
+async def handle_probe(handle, device, pfx):
+    """
+    Get lines of output for an opened device, see device_probe().
+    A hub failing to report its status is still listed, only its port
+    status is omitted.
+    """
+    d = device.descriptor
     try:
-        product = device.product
-        manufacturer = device.manufacturer
+        strings = await handle.strings_get([d.manufacturer_index, d.product_index])
     except:
-        product = ""
-        manufacturer = ""
+        strings = {}
+    manufacturer = strings.get(d.manufacturer_index, "")
+    product = strings.get(d.product_index, "")
 
-    print("%s%04x:%04x %s %s" % (
+    lines = ["%s%04x:%04x %s %s" % (
         pfx,
         device.vendor_id, device.product_id,
-        manufacturer, product))
+        manufacturer, product)]
 
     if device.classes != (9, 0):
-        return
+        return lines, []
 
     try:
         hub = await Hub.create(handle)
-    except NotImplementedError:
-        return
+    except Exception:
+        return lines, []
 
-    ps, _ = await hub.status_get()
-    print("%s  Hub Status %s" % (pfx, ps))
+    status, statuses = await asyncio.gather(hub.status_get(), hub.ports_status(),
+                                            return_exceptions = True)
 
-    for port in hub:
-        ps, _ = await port.status_get()
-        print("%s  * Port %d (%s) %s" % (pfx, port.index, "removable" if port.removable else "fixed", ps))
+    if not isinstance(status, BaseException):
+        lines.append("%s  Hub Status %s" % (pfx, status[0]))
+    if isinstance(statuses, BaseException):
+        statuses = [None] * len(hub)
 
-        try:
-            child = device.context.device_get(ports = port.ports, bus = device.bus)
-        except ValueError:
-            continue
+    ports = []
+    for port, st in zip(hub, statuses):
+        line = "%s  * Port %d (%s)" % (
+            pfx, port.index, "removable" if port.removable else "fixed")
+        if st is not None:
+            line += " %s" % st[0]
+        ports.append((port.index, line))
+
+    return lines, ports
+
+async def tree_dump(probes, children, device):
+    """
+    Print a device subtree, as soon as its probes are done.
+    """
+    lines, ports = await probes[device.key]
+    if not lines:
+        return
+
+    for line in lines:
+        print(line)
 
-        await device_dump(child)
+    below = children.get((device.bus, device.ports), {})
+    for index, line in ports:
+        print(line)
+        child = below.get(index)
+        if child is not None:
+            await tree_dump(probes, children, child)
 
-async def ausb_list(loop):
+async def ausb_tree(loop, concurrency):
     c = Context(loop)
-    for d in sorted(c.device_filter(ports = []), key = lambda x:x.bus):
-        if d.port:
-            continue
-        await device_dump(d)
+    snapshot = c.snapshot()
+
+    children = {}
+    roots = []
+    for d in snapshot:
+        if d.ports:
+            children.setdefault((d.bus, d.ports[:-1]), {})[d.ports[-1]] = d
+        else:
+            roots.append(d)
+
+    limit = asyncio.Semaphore(concurrency)
+    probes = {}
+    for d in snapshot:
+        probes[d.key] = asyncio.ensure_future(device_probe(limit, d))
+
+    try:
+        for d in sorted(roots, key = lambda x:x.bus):
+            await tree_dump(probes, children, d)
+    finally:
+        for p in probes.values():
+            p.cancel()
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
-    t = loop.create_task(ausb_list(loop))
+    t = loop.create_task(ausb_tree(loop, int(sys.argv[1]) if len(sys.argv) > 1 else 8))
     loop.run_until_complete(t)
@@ -1,84 +1,432 @@
+import array
 import asyncio
+import collections
 import enum
+import hashlib
+import json
+import mmap
+import os
+import shutil
 import struct
+import sys
+import time
+from ..constant import *
 
 class FirmwareImage:
+    """
+    Cypress FX image. Segments are (address, data) couples, where data
+    is a memoryview on image content.
+    """
     def __init__(self):
         self.segments = []
         self.entry_point = None
+        self.__chunks = {}
+
+    @property
+    def size(self):
+        """
+        Total size of segments, bytes
+        """
+        return sum(len(data) for address, data in self.segments)
+
+    def chunks(self, size):
+        """
+        Segments split in chunks of at most size bytes, as a list of
+        (address, data) couples. Result is computed once per size.
+        """
+        chunks = self.__chunks.get(size)
+        if chunks is None:
+            chunks = []
+            for base_address, data in self.segments:
+                for off in range(0, len(data), size):
+                    chunks.append((base_address + off, data[off : off + size]))
+            self.__chunks[size] = chunks
+        return chunks
 
     @classmethod
     def from_file(cls, filename):
-        """Load a Program from a Cypress FX image file"""
-        if filename.endswith(".img.gz"):
+        """
+        Load a Program from a Cypress FX image file. Uncompressed images
+        are memory-mapped, gzip-compressed ones (.gz) are decompressed
+        as a stream.
+        """
+        if filename.endswith(".gz"):
             import gzip
-            open_ = gzip.open
-        else:
-            open_ = open
+            with gzip.open(filename, 'rb') as fd:
+                return cls.from_stream(fd)
 
         with open(filename, 'rb') as fd:
-            header, ctl, typ = struct.unpack("2sBB", fd.read(4))
-            if header != b"CY":
+            try:
+                data = mmap.mmap(fd.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:
                 raise ValueError("Bad file header")
+        return cls.from_buffer(data)
+
+    @classmethod
+    def from_buffer(cls, data):
+        """
+        Load a Program from a Cypress FX image in a buffer, segments
+        are views on buffer, without copy.
+        """
+        view = memoryview(data)
+        if len(view) < 4 or struct.unpack_from("2s", view)[0] != b"CY":
+            raise ValueError("Bad file header")
 
-            self = cls()
+        self = cls()
+        chk = 0
+        off = 4
 
-            chk = 0
+        while True:
+            if off + 8 > len(view):
+                raise ValueError("Truncated file")
+            size, address = struct.unpack_from("<LL", view, off)
+            off += 8
+            if size == 0:
+                self.entry_point = address
+                break
+            if off + size * 4 > len(view):
+                raise ValueError("Truncated file")
+            blob = view[off : off + size * 4]
+            off += size * 4
+            self.segments.append((address, blob))
+            chk += cls._checksum(blob)
 
-            while True:
-                ch = fd.read(8)
-                size, address = struct.unpack("<LL", ch)
-                if size == 0:
-                    self.entry_point = address
-                    break
-                blob = fd.read(size * 4)
-                self.segments.append((address, blob))
-                chk += sum(struct.unpack("<%dL" % (len(blob) // 4), blob))
+        if off + 4 > len(view):
+            raise ValueError("Truncated file")
+        checksum, = struct.unpack_from("<L", view, off)
+
+        if checksum != chk & 0xffffffff:
+            raise ValueError("Bad file checksum")
+
+        return self
+
+    @classmethod
+    def from_stream(cls, fd):
+        """
+        Load a Program from a Cypress FX image read sequentially from a
+        file object.
+        """
+        def read(size):
+            data = fd.read(size)
+            if len(data) != size:
+                raise ValueError("Truncated file")
+            return data
 
-            checksum, = struct.unpack("<L", fd.read(4))
+        header, ctl, typ = struct.unpack("2sBB", read(4))
+        if header != b"CY":
+            raise ValueError("Bad file header")
 
-            if checksum != chk & 0xffffffff:
-                raise ValueError("Bad file checksum")
+        self = cls()
+        chk = 0
 
-            return self
+        while True:
+            size, address = struct.unpack("<LL", read(8))
+            if size == 0:
+                self.entry_point = address
+                break
+            blob = bytearray(size * 4)
+            if fd.readinto(blob) != len(blob):
+                raise ValueError("Truncated file")
+            blob = memoryview(blob)
+            self.segments.append((address, blob))
+            chk += cls._checksum(blob)
+
+        checksum, = struct.unpack("<L", read(4))
+
+        if checksum != chk & 0xffffffff:
+            raise ValueError("Bad file checksum")
+
+        return self
+
+    @staticmethod
+    def _checksum(blob):
+        """
+        Sum of little-endian 32-bit words of blob.
+        """
+        if sys.byteorder == "little":
+            return sum(memoryview(blob).cast("I"))
+        words = array.array("I")
+        words.frombytes(blob)
+        words.byteswap()
+        return sum(words)
 
     def __iter__(self):
         return iter(self.segments)
-        
+
+class FirmwareCache:
+    """
+    Cache of parsed FirmwareImage objects.
+
+    In-process cache is keyed by file path, size and modification time,
+    a hit costs a stat() call. Entries are evicted in LRU order when
+    there are more than max_entries of them or when their total size
+    exceeds max_size.
+
+    If a directory is given, segment tables of validated images are
+    also stored on disk, keyed by file content hash, so that other
+    processes can skip parsing and checksumming. Compressed images get
+    their decompressed content stored as well. Disk entries are
+    evicted in LRU order when their total size exceeds max_size.
+
+    Cached images have their chunking for Fx.CTRL_MAX_PACKET_SIZE
+    computed upfront.
+    """
+    def __init__(self, directory = None, max_entries = 16, max_size = 64 << 20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__images = collections.OrderedDict()
+        self.__size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def load(self, filename):
+        """
+        Get FirmwareImage for filename, from cache if possible.
+        """
+        st = os.stat(filename)
+        key = (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+
+        image = self.__images.get(key)
+        if image is not None:
+            self.__images.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = None
+        if self.directory is not None:
+            digest = self._digest(filename)
+            image = self._disk_load(filename, digest)
+        if image is None:
+            image = FirmwareImage.from_file(filename)
+            if self.directory is not None:
+                self._disk_store(filename, digest, image)
+
+        image.chunks(Fx.CTRL_MAX_PACKET_SIZE)
+        self.__images[key] = image
+        self.__size += image.size
+        while self.__images and (len(self.__images) > self.max_entries
+                                 or self.__size > self.max_size):
+            _, old = self.__images.popitem(last = False)
+            self.__size -= old.size
+
+        return image
+
+    def clear(self):
+        """
+        Drop in-process entries.
+        """
+        self.__images.clear()
+        self.__size = 0
+
+    @staticmethod
+    def _digest(filename):
+        h = hashlib.sha256()
+        with open(filename, 'rb') as fd:
+            for block in iter(lambda: fd.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _path(self, digest, suffix):
+        return os.path.join(self.directory, digest + suffix)
+
+    def _disk_load(self, filename, digest):
+        try:
+            with open(self._path(digest, ".json")) as fd:
+                table = json.load(fd)
+            source = self._path(digest, ".bin") if table["compressed"] else filename
+            with open(source, 'rb') as fd:
+                data = mmap.mmap(fd.fileno(), 0, access = mmap.ACCESS_READ)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        view = memoryview(data)
+        image = FirmwareImage()
+        image.entry_point = table["entry_point"]
+        for address, offset, length in table["segments"]:
+            image.segments.append((address, view[offset : offset + length]))
+
+        for suffix in (".json", ".bin"):
+            try:
+                os.utime(self._path(digest, suffix))
+            except OSError:
+                pass
+        return image
+
+    def _disk_store(self, filename, digest, image):
+        compressed = filename.endswith(".gz")
+        segments = []
+        offset = 4
+        for address, data in image.segments:
+            offset += 8
+            segments.append((address, offset, len(data)))
+            offset += len(data)
+        table = {
+            "compressed": compressed,
+            "entry_point": image.entry_point,
+            "segments": segments,
+        }
+
+        try:
+            if compressed:
+                import gzip
+                with gzip.open(filename, 'rb') as src, \
+                     open(self._path(digest, ".bin.tmp"), 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(self._path(digest, ".bin.tmp"), self._path(digest, ".bin"))
+            with open(self._path(digest, ".json.tmp"), 'w') as fd:
+                json.dump(table, fd)
+            os.replace(self._path(digest, ".json.tmp"), self._path(digest, ".json"))
+        except OSError:
+            return
+
+        self._disk_evict()
+
+    def _disk_evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+# Default cache, stored on disk in AUSB_FIRMWARE_CACHE directory if set
+firmware_cache = FirmwareCache(os.environ.get("AUSB_FIRMWARE_CACHE"))
+
+def _firmware_get(firmware):
+    """
+    Get a FirmwareImage, firmware may also be a filename, it is then
+    loaded through firmware_cache.
+    """
+    if isinstance(firmware, (str, os.PathLike)):
+        return firmware_cache.load(os.fspath(firmware))
+    return firmware
+
+class UploadStats:
+    """
+    Memory upload statistics, returned by Fx.memory_upload().
+    """
+    def __init__(self, size, elapsed):
+        self.size = size
+        self.elapsed = elapsed
+
+    @property
+    def throughput(self):
+        """
+        Upload throughput, bytes per second
+        """
+        return self.size / self.elapsed if self.elapsed else 0
+
+    def __str__(self):
+        return "%d bytes in %.3fs (%.1f kB/s)" % (
+            self.size, self.elapsed, self.throughput / 1000)
+
 class Fx:
     def __init__(self, handle):
         self.handle = handle
 
     CTRL_MAX_PACKET_SIZE = 4096
+    UPLOAD_DEPTH = 4
 
     async def mem_rw(self, addr, data_or_length):
-        return await self.handle.vendor_control(
-            0xa0, addr & 0xffff, addr >> 16, data_or_length)
-    
-    async def memory_upload(self, segments):
+        return await self.handle.control(*self._mem_request(addr, data_or_length))
+
+    @staticmethod
+    def _mem_request(addr, data_or_length):
+        """
+        Memory access request, as Device.control() arguments.
+        """
+        return (RequestTypeType.Vendor, RequestTypeRecipient.Device,
+                0xa0, addr & 0xffff, addr >> 16, data_or_length)
+
+    def _chunks(self, segments):
+        if isinstance(segments, FirmwareImage):
+            return segments.chunks(self.CTRL_MAX_PACKET_SIZE)
+        return self.__split(segments)
+
+    def __split(self, segments):
         for base_address, data in segments:
-            off = 0
             for off in range(0, len(data), self.CTRL_MAX_PACKET_SIZE):
-                addr = base_address + off
-                chunk = data[off : off + self.CTRL_MAX_PACKET_SIZE]
+                yield base_address + off, data[off : off + self.CTRL_MAX_PACKET_SIZE]
+
+    async def memory_upload(self, segments, depth = None, verify = True, progress = None):
+        """
+        Upload segments to device memory.
+
+        Writes are issued as a control batch, with up to depth requests
+        in flight. Verification reads all data back once all writes are
+        done, batched the same way.
 
-                await self.mem_rw(addr, chunk)
-                readback = await self.mem_rw(addr, len(chunk))
+        :param segments: Iterable of (address, data) couples, or a
+          FirmwareImage, whose chunking is reused
+        :param depth: Count of requests in flight, defaults to UPLOAD_DEPTH
+        :param verify: Whether to read data back for verification
+        :param progress: Function called with (done, total) byte counts
+          as requests complete, readbacks count in total if verifying
+        :returns: An UploadStats instance
+        """
+        depth = depth or self.UPLOAD_DEPTH
+        chunks = list(self._chunks(segments))
+        size = sum(len(chunk) for addr, chunk in chunks)
+        total = size * 2 if verify else size
+        done = 0
+        start = time.monotonic()
 
-                if readback == chunk:
-                    continue
+        def advance(position, result):
+            nonlocal done
+            if isinstance(result, BaseException):
+                return
+            done += len(chunks[position][1])
+            if progress:
+                progress(done, total)
 
-                raise RuntimeError("Bad readback data")
+        def check(results, verify):
+            for (addr, chunk), result in zip(chunks, results):
+                if isinstance(result, BaseException):
+                    raise result
+                if verify and result != chunk:
+                    raise RuntimeError("Bad readback data at %08x" % addr)
+
+        results = await self.handle.control_batch(
+            (self._mem_request(a, c) for a, c in chunks), depth, advance)
+        check(results, False)
+        if verify:
+            results = await self.handle.control_batch(
+                (self._mem_request(a, len(c)) for a, c in chunks), depth, advance)
+            check(results, True)
+
+        return UploadStats(size, time.monotonic() - start)
 
 class Fx2(Fx):
     async def cpu_control(self, *, enabled = False):
-        await self.mem_rw(0xe600, bytes([int(enabled)]))
+        # CPUCS bit 0 holds 8051 in reset
+        await self.mem_rw(0xe600, bytes([int(not enabled)]))
 
-    async def firmware_load(self, firmware):
+    async def firmware_load(self, firmware, progress = None):
+        """
+        :param firmware: FirmwareImage, or its filename
+        """
+        firmware = _firmware_get(firmware)
         self.handle.configuration = 0
         await self.cpu_control(enabled = False)
-        await self.memory_upload(firmware.segments)
-        await self.cpu_control(enabled = true)
+        stats = await self.memory_upload(firmware, progress = progress)
+        await self.cpu_control(enabled = True)
+        return stats
         
 
 class Fx3(Fx):
@@ -88,8 +436,125 @@ class Fx3(Fx):
     async def jump_to(self, addr):
         await self.mem_rw(addr, b'')
 
-    async def firmware_load(self, firmware):
-        await self.memory_upload(firmware.segments)
+    async def firmware_load(self, firmware, progress = None):
+        """
+        :param firmware: FirmwareImage, or its filename
+        """
+        firmware = _firmware_get(firmware)
+        stats = await self.memory_upload(firmware, progress = progress)
         await self.jump_to(firmware.entry_point)
         await asyncio.sleep(.6)
+        return stats
         
+
+class LoadResult:
+    """
+    Outcome of firmware loading on one device, see firmware_load_all().
+    """
+    def __init__(self, device):
+        self.device = device
+        self.elapsed = None
+        self.stats = None
+        self.error = None
+        self.reenumerated = None
+
+    def __str__(self):
+        d = self.device
+        where = "Bus %03d Port %s" % (d.bus, ".".join(str(p) for p in d.ports) or "-")
+        if self.error is not None:
+            return "%s: failed after %.3fs: %r" % (where, self.elapsed, self.error)
+        if self.reenumerated is None:
+            return "%s: loaded in %.3fs, %s, not re-enumerated" % (
+                where, self.elapsed, self.stats)
+        return "%s: loaded in %.3fs, %s, now %04x:%04x" % (
+            where, self.elapsed, self.stats,
+            self.reenumerated.vendor_id, self.reenumerated.product_id)
+
+class _Rescan:
+    """
+    Periodic context rescan, shared by tasks waiting for devices to
+    show up. Context is invalidated once per interval, whatever the
+    count of waiting tasks.
+    """
+    def __init__(self, context, interval = .1):
+        self.context = context
+        self.interval = interval
+        self.__next = None
+
+    async def wait(self):
+        """
+        Wait for next rescan. Cancelling a waiter does not delay others.
+        """
+        if self.__next is None:
+            self.__next = asyncio.ensure_future(self._rescan())
+        await asyncio.shield(self.__next)
+
+    async def _rescan(self):
+        try:
+            await asyncio.sleep(self.interval)
+            self.context.invalidate()
+        finally:
+            self.__next = None
+
+async def _reenumerated(context, bus, ports, address, timeout, rescan):
+    """
+    Wait for a new device at (bus, ports). Device still having address
+    is the one that was there before, i.e. it did not disconnect yet.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        for d in context.device_filter(bus = bus, ports = ports):
+            if d.address != address:
+                return d
+        if time.monotonic() >= deadline:
+            return None
+        await rescan.wait()
+
+async def firmware_load_all(context, firmware, devices, loader = Fx3,
+                            per_bus = 4, reenumerate_timeout = 5.0):
+    """
+    Load firmware into many devices concurrently.
+
+    Each device gets its own task. At most per_bus devices of a given
+    bus are loaded at the same time, to avoid saturating a shared host
+    controller. Once firmware started, device is looked up again at
+    the same place in the topology.
+
+    :param context: Context devices belong to
+    :param firmware: FirmwareImage to load, or its filename, loaded
+      through firmware_cache
+    :param devices: Iterable of descriptor.Device to load
+    :param loader: Fx subclass driving devices
+    :param per_bus: Maximum count of concurrent loads per bus
+    :param reenumerate_timeout: Time to wait for device to show up
+      again after firmware start, seconds
+    :returns: List of LoadResult, in devices order
+    """
+    firmware = _firmware_get(firmware)
+    limits = {}
+    rescan = _Rescan(context)
+
+    async def load(device):
+        result = LoadResult(device)
+        bus, ports, address = device.bus, device.ports, device.address
+        limit = limits.setdefault(bus, asyncio.Semaphore(per_bus))
+        async with limit:
+            start = time.monotonic()
+            try:
+                handle = await device.open_async()
+                try:
+                    result.stats = await loader(handle).firmware_load(firmware)
+                finally:
+                    handle.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result.error = e
+            result.elapsed = time.monotonic() - start
+
+        if result.error is None:
+            result.reenumerated = await _reenumerated(
+                context, bus, ports, address, reenumerate_timeout, rescan)
+        return result
+
+    return await asyncio.gather(*(load(d) for d in devices))
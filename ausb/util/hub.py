@@ -1,4 +1,8 @@
+import asyncio
 import struct
+import usb1
+import weakref
+from .. import snapshot
 from ..exception import *
 from ..constant import *
 import enum
@@ -55,12 +59,72 @@ class DescriptorType(enum.IntEnum):
     Hub = 0x0029
     SsHub = 0x002a
     
+class HubDescriptor:
+    """
+    Parsed hub class descriptor.
+    """
+    __slots__ = ("type", "port_count", "characteristics",
+                 "power_good_delay", "current", "removable_mask")
+
+    def __init__(self, desc):
+        l, t, port_count, car, pwr, cont = struct.unpack("<BBBHBB", desc[:7])
+        if t == DescriptorType.Hub:
+            bc = (port_count+8) // 8
+            fixed = int.from_bytes(desc[7 : 7 + bc], "little")
+        elif t == DescriptorType.SsHub:
+            declat, delay, fixed = struct.unpack("<BBH", desc[7:11])
+        else:
+            raise NotImplementedError()
+
+        self.type = DescriptorType(t)
+        self.port_count = port_count
+        self.characteristics = car
+        self.power_good_delay = pwr * 2
+        self.current = cont
+        self.removable_mask = fixed
+
+    def removable(self, index):
+        """
+        Whether device on port index (1-based) is removable
+        """
+        return not ((self.removable_mask >> index) & 1)
+
+# Hub descriptors, per context, by device key
+_descriptors = weakref.WeakKeyDictionary()
+
+def _descriptor_cache(context):
+    """
+    Get hub descriptor cache for a context.
+
+    Cache maps device keys to (device snapshot reference, descriptor).
+    Whenever context takes a new snapshot, entries are dropped if their
+    device left it, even if another device got the same key since.
+    """
+    s = context.snapshot()
+    stamp, cache = _descriptors.get(context, (None, {}))
+    if stamp != (s.generation, s.timestamp):
+        devices = {d.key: d for d in s}
+        for key, (device, descriptor) in list(cache.items()):
+            current = devices.get(key)
+            if current is None or current is not device():
+                del cache[key]
+        _descriptors[context] = ((s.generation, s.timestamp), cache)
+    return cache
+
 class Port:
+    __slots__ = ("hub", "index", "removable")
+
     def __init__(self, hub, index, removable):
         self.hub = hub
         self.index = index
         self.removable = removable
-        self.ports = self.hub.handle.descriptor.ports + [index]
+
+    @property
+    def ports(self):
+        """
+        Hierarchical list of port numbers to get to the device on this port
+        """
+        return self.hub.ports + [self.index]
     
     async def feature_clear(self, feature):
         await self.hub.handle.control(RequestTypeType.Class,
@@ -79,6 +143,22 @@ class Port:
         ps, cs = struct.unpack("<HH", st)
         return PortStatus(ps), PortStatus(cs)
 
+    _CHANGE_FEATURES = (
+        (PortStatus.CurrentConnection, HubPortFeature.CPortConnection),
+        (PortStatus.Enable, HubPortFeature.CPortEnable),
+        (PortStatus.Suspend, HubPortFeature.CPortSuspend),
+        (PortStatus.OverCurrent, HubPortFeature.CPortOverCurrent),
+        (PortStatus.Reset, HubPortFeature.CPortReset),
+    )
+
+    async def change_clear(self, change):
+        """
+        Acknowledge port status changes, as returned by status_get().
+        """
+        await asyncio.gather(*(self.feature_clear(feature)
+                               for flag, feature in self._CHANGE_FEATURES
+                               if change & flag))
+
 class Hub:
     def __init__(self, handle):
         self.handle = handle
@@ -90,21 +170,25 @@ class Hub:
         return self
         
     async def _init(self):
-        try:
-            desc = await self.descriptor_get_std(0)
-        except TransferStalled:
-            raise NotImplementedError()
+        d = self.handle.descriptor
+        self.ports = list(d.ports)
+        key = snapshot.device_key(d.device)
+        cache = _descriptor_cache(self.handle.context)
 
-        l, t, port_count, car, pwr, cont = struct.unpack("<BBBHBB", desc[:7])
-        if t == DescriptorType.Hub:
-            bc = (port_count+8) // 8
-            fixed = int.from_bytes(desc[7 : 7 + bc], "little")
-        elif t == DescriptorType.SsHub:
-            declat, delay, fixed = struct.unpack("<BBH", desc[7:11])
+        self.descriptor = cache.get(key, (None, None))[1]
+        if self.descriptor is None:
+            try:
+                desc = await self.descriptor_get_std(0)
+            except TransferStalled:
+                raise NotImplementedError()
+            self.descriptor = HubDescriptor(desc)
+            for device in self.handle.context.snapshot():
+                if device.key == key:
+                    cache[key] = (weakref.ref(device), self.descriptor)
 
         self.port = []
-        for i in range(port_count):
-            self.port.append(Port(self, i + 1, not ((fixed >> i) & 2)))
+        for i in range(self.descriptor.port_count):
+            self.port.append(Port(self, i + 1, self.descriptor.removable(i + 1)))
 
     def __getitem__(self, index):
         return self.port[index]
@@ -114,6 +198,80 @@ class Hub:
 
     def __iter__(self):
         return iter(self.port)
+
+    async def ports_status(self):
+        """
+        Get status of all ports, requests are issued as a batch.
+
+        :returns: A list of (status, change) couples, in port order
+        """
+        results = await self.handle.control_batch(
+            (RequestTypeType.Class, RequestTypeRecipient.Other,
+             Request.GetStatus, 0, p.index, 4)
+            for p in self.port)
+
+        statuses = []
+        for st in results:
+            if isinstance(st, BaseException):
+                raise st
+            ps, cs = struct.unpack("<HH", st)
+            statuses.append((PortStatus(ps), PortStatus(cs)))
+        return statuses
+
+    def _status_endpoint(self):
+        """
+        Claim hub interface and open its status change endpoint.
+        """
+        interface = self.handle.interface_claim(0)
+        for endpoint in interface.descriptor:
+            if endpoint.type == "interrupt" and endpoint.direction == "in":
+                return interface.open(endpoint)
+        raise NotImplementedError()
+
+    async def monitor(self, interval = 1.0, interrupt = True):
+        """
+        Asynchronous generator of port changes, yields (port, status,
+        change) for changed ports only.
+
+        If interrupt is true, hub interface is claimed and changes are
+        taken from hub status change endpoint, and acknowledged. This
+        requires no kernel driver to be bound to the hub. Otherwise, or
+        if claiming fails, all ports are polled every interval seconds
+        and compared to previous status.
+        """
+        endpoint = None
+        if interrupt:
+            try:
+                endpoint = self._status_endpoint()
+            except (usb1.USBError, NotImplementedError):
+                endpoint = None
+
+        previous = await self.ports_status()
+
+        try:
+            while True:
+                if endpoint is not None:
+                    bitmap = int.from_bytes(await endpoint.read(), "little")
+                    ports = [p for p in self.port if (bitmap >> p.index) & 1]
+                    statuses = await asyncio.gather(*(p.status_get() for p in ports))
+                    await asyncio.gather(*(p.change_clear(change)
+                                           for p, (status, change) in zip(ports, statuses)))
+                    for p, (status, change) in zip(ports, statuses):
+                        previous[p.index - 1] = (status, change)
+                        yield p, status, change
+                else:
+                    await asyncio.sleep(interval)
+                    current = await self.ports_status()
+                    for p, old, new in zip(self.port, previous, current):
+                        if old != new:
+                            yield p, new[0], new[1]
+                    previous = current
+        finally:
+            if endpoint is not None:
+                try:
+                    self.handle.handle.releaseInterface(0)
+                except usb1.USBError:
+                    pass
             
     async def descriptor_get(self, type, index):
         return await self.handle.control(RequestTypeType.Class,
@@ -0,0 +1,62 @@
+"""
+ausb benchmarks. They run against the simulated backend (ausb.sim),
+no hardware is needed. See benchmarks.__main__ for the runner.
+
+Benchmarks are coroutine functions registered with @benchmark. They
+report results through a Report, each result has a name, a value, a
+unit and whether higher is better.
+"""
+
+import statistics
+import time
+
+__all__ = ["benchmark", "BENCHMARKS", "Report", "latency_measure", "throughput_measure"]
+
+BENCHMARKS = []
+
+def benchmark(function):
+    """
+    Register a benchmark coroutine function, called with a Report.
+    """
+    BENCHMARKS.append(function)
+    return function
+
+class Report:
+    """
+    Results of a benchmark run, by name.
+    """
+    def __init__(self):
+        self.results = {}
+
+    def add(self, name, value, unit, higher_is_better = False):
+        self.results[name] = {
+            "value": value,
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+        }
+
+async def latency_measure(report, name, operation, iterations = 1000, warmup = 50):
+    """
+    Measure latency of an async operation called back to back. Reports
+    median and 99th percentile.
+    """
+    for i in range(warmup):
+        await operation()
+
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await operation()
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    report.add(name + ".median", statistics.median(samples), "s")
+    report.add(name + ".p99", samples[int(len(samples) * .99)], "s")
+
+async def throughput_measure(report, name, operation, size):
+    """
+    Measure throughput of an async operation moving size bytes.
+    """
+    start = time.perf_counter()
+    await operation()
+    report.add(name, size / (time.perf_counter() - start), "B/s", higher_is_better = True)
@@ -0,0 +1,110 @@
+"""
+Benchmark runner:
+
+  python3 -m benchmarks [results.json [baseline.json [threshold]]]
+
+Runs all benchmarks on the simulated backend and prints results. They
+are saved as JSON if a results file is given (may be empty). If a
+baseline results file is given, results are compared against it, and
+runner exits with status 1 if any result regressed by more than
+threshold (relative, defaults to THRESHOLD).
+
+AUSB_BENCHMARK_RUNS environment variable repeats the whole suite, each
+result keeps its least favourable value over runs.
+
+benchmarks/baseline.json is the reference, regenerate it with:
+
+  AUSB_BENCHMARK_RUNS=5 python3 -m benchmarks benchmarks/baseline.json
+"""
+
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from . import BENCHMARKS, Report
+from . import transfer, enumeration, firmware
+
+THRESHOLD = 0.2
+RUNS = int(os.environ.get("AUSB_BENCHMARK_RUNS", 1))
+
+def run():
+    report = Report()
+    for function in BENCHMARKS:
+        print("Running %s" % function.__name__, file = sys.stderr)
+        asyncio.run(function(report))
+    return report
+
+def worst(runs):
+    """
+    Merge results of several runs, keeping least favourable value of
+    each result.
+    """
+    merged = {}
+    for results in runs:
+        for name, result in results.items():
+            reference = merged.get(name)
+            if reference is None or regression(result, reference) > 0:
+                merged[name] = result
+    return merged
+
+def regression(result, reference):
+    """
+    Get relative regression of a result against its reference, positive
+    when worse.
+    """
+    if not reference["value"]:
+        return 0.0
+    change = (result["value"] - reference["value"]) / reference["value"]
+    return -change if result["higher_is_better"] else change
+
+def compare(results, baseline, threshold = THRESHOLD):
+    """
+    :returns: List of (name, regression) for results regressing by more
+      than threshold against baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        r = regression(result, reference)
+        if r > threshold:
+            regressions.append((name, r))
+    return regressions
+
+def dump(results, baseline):
+    """
+    Print results, with regression against baseline when available.
+    """
+    for name, result in sorted(results.items()):
+        line = "%-36s %12.4g %-4s" % (name, result["value"], result["unit"])
+        reference = baseline.get(name)
+        if reference is not None:
+            line += " %+7.1f%%" % (100 * regression(result, reference))
+        print(line)
+
+if __name__ == "__main__":
+    baseline = {}
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else THRESHOLD
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as fd:
+            baseline = json.load(fd)["results"]
+
+    results = worst(run().results for i in range(RUNS))
+    dump(results, baseline)
+
+    if len(sys.argv) > 1 and sys.argv[1]:
+        with open(sys.argv[1], "w") as fd:
+            json.dump({
+                "timestamp": time.time(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, fd, indent = 2, sort_keys = True)
+
+    regressions = compare(results, baseline, threshold)
+    for name, r in regressions:
+        print("Regression: %s is %.1f%% worse than baseline" % (name, 100 * r))
+    sys.exit(1 if regressions else 0)
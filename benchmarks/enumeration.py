@@ -0,0 +1,112 @@
+"""
+Device lookup and descriptor tree walk cost, as device count grows.
+"""
+
+import asyncio
+import gc
+import time
+import ausb
+from ausb import sim
+from . import *
+
+HUBS_PER_BUS = 8
+DEVICES_PER_HUB = 12
+
+def host_create(count):
+    """
+    Populate a host with count devices, on hubs spread over as many
+    buses as needed to fit in 127 addresses per bus.
+    """
+    host = sim.Host()
+    for i in range(count):
+        bus, n = divmod(i, HUBS_PER_BUS * DEVICES_PER_HUB)
+        hub, port = divmod(n, DEVICES_PER_HUB)
+        root = host.bus(bus + 1, port_count = HUBS_PER_BUS)
+        if hub + 1 not in root.children:
+            root.attach(hub + 1, sim.Hub(port_count = DEVICES_PER_HUB))
+        root.children[hub + 1].attach(port + 1, sim.Device(
+            0x1234, i, serial = "%08d" % i,
+            endpoints = [
+                sim.Endpoint(0x81, "bulk", 512),
+                sim.Endpoint(0x02, "bulk", 512),
+            ]))
+    return host
+
+def timed(operation, iterations, rounds = 5):
+    """
+    Time a synchronous operation, with garbage collector disabled
+    like timeit does. Best round is kept, others are considered
+    disturbed.
+    """
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        for r in range(rounds):
+            start = time.perf_counter()
+            for i in range(iterations):
+                operation()
+            elapsed = (time.perf_counter() - start) / iterations
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best
+
+def tree_walk(context):
+    """
+    Touch all descriptor attributes, the way dev_info tool does.
+    """
+    for device in context:
+        device.bus, device.address, device.vendor_id, device.product_id
+        device.device_version, device.usb_version, device.speed
+        device.classes, device.max_packet_size0
+        for configuration in device.configurations:
+            configuration.number
+            for interface in configuration:
+                for setting in interface:
+                    for endpoint in setting:
+                        endpoint.type, endpoint.direction, endpoint.number
+                        endpoint.max_packet_size, endpoint.interval
+
+@benchmark
+async def device_lookup(report):
+    """
+    Snapshot refresh and device_filter lookups, for growing device
+    counts. Lookups are run on a warm snapshot.
+    """
+    loop = asyncio.get_running_loop()
+
+    for count in (10, 100, 500):
+        host = host_create(count)
+
+        def cold():
+            c = ausb.Context(loop, backend = host.USBContext)
+            c.snapshot()
+            c.notifier.close()
+
+        ctx = ausb.Context(loop, backend = host.USBContext)
+        ctx.snapshot()
+
+        def refresh():
+            ctx.invalidate()
+            ctx.snapshot()
+
+        product_id = count // 2
+        def by_id():
+            ctx.device_get(vendor_id = 0x1234, product_id = product_id)
+
+        def by_serial():
+            ctx.device_get(serial = "%08d" % product_id)
+
+        def by_class():
+            list(ctx.device_filter(classes = (9, 0)))
+
+        prefix = "lookup.%d." % count
+        report.add(prefix + "cold", timed(cold, 4), "s")
+        report.add(prefix + "refresh", timed(refresh, 10), "s")
+        report.add(prefix + "by_id", timed(by_id, 1000), "s")
+        report.add(prefix + "by_serial", timed(by_serial, 1000), "s")
+        report.add(prefix + "scan", timed(by_class, 100), "s")
+        report.add(prefix + "tree_walk", timed(lambda: tree_walk(ctx), 4), "s")
+
+        ctx.notifier.close()
@@ -0,0 +1,30 @@
+"""
+FX3 firmware upload time.
+"""
+
+import asyncio
+import ausb
+from ausb import sim
+from ausb.util.fx import Fx3
+from . import *
+
+SIZE = 256 << 10
+
+@benchmark
+async def firmware_upload(report):
+    """
+    Upload and verify a 256kB image through a bootloader with 125us
+    control latency and a 20MB/s control pipe, at various pipelining
+    depths.
+    """
+    host = sim.Host()
+    host.bus(1).attach(1, sim.FxBootloader(latency = 0.000125, bandwidth = 20e6))
+    ctx = ausb.Context(asyncio.get_running_loop(), backend = host.USBContext)
+    fx = Fx3(ctx.device_get(vendor_id = 0x04b4, product_id = 0x00f3).open())
+
+    data = bytes(i & 0xff for i in range(SIZE))
+    for depth in (1, 4, 8):
+        stats = await fx.memory_upload([(0x40000000, data)], depth = depth)
+        report.add("fx3.upload.%d" % depth, stats.elapsed, "s")
+
+    ctx.notifier.close()
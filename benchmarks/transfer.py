@@ -0,0 +1,119 @@
+"""
+Single transfer latency and streaming throughput.
+"""
+
+import asyncio
+import time
+import ausb
+from ausb import sim
+from ausb.constant import *
+from . import *
+
+VENDOR_ID = 0x1234
+PRODUCT_ID = 0x0001
+
+def host_create(latency = 0.0, bandwidth = None):
+    host = sim.Host()
+    host.bus(1).attach(1, sim.Device(VENDOR_ID, PRODUCT_ID, latency = latency, endpoints = [
+        sim.Endpoint(0x81, "bulk", 512, latency = latency, bandwidth = bandwidth),
+        sim.Endpoint(0x02, "bulk", 512, latency = latency, bandwidth = bandwidth),
+        sim.Endpoint(0x83, "interrupt", 64, interval = 1, latency = latency),
+    ]))
+    return host
+
+def device_open(host, event_thread = False):
+    """
+    :returns: (context, handle, endpoints by address)
+    """
+    ctx = ausb.Context(asyncio.get_running_loop(), backend = host.USBContext,
+                       event_thread = event_thread)
+    handle = ctx.device_get(vendor_id = VENDOR_ID, product_id = PRODUCT_ID).open()
+    interface = handle.interface_claim(0)
+    endpoints = {}
+    for address in (0x81, 0x02, 0x83):
+        endpoints[address] = interface.open(interface.descriptor.endpoint_by_address(address))
+    return ctx, handle, endpoints
+
+@benchmark
+async def transfer_latency(report):
+    """
+    Round trip of single transfers through the whole stack, device
+    side answers immediately.
+    """
+    for event_thread in (False, True):
+        prefix = "latency.thread" if event_thread else "latency"
+        ctx, handle, endpoints = device_open(host_create(), event_thread)
+
+        await latency_measure(report, prefix + ".control_in",
+                              lambda: handle.standard_control(Request.GetStatus, 0, 0, 2))
+        requests = [(RequestTypeType.Standard, RequestTypeRecipient.Device,
+                     Request.GetStatus, 0, 0, 2)] * 1000
+        await handle.control_batch(requests[:50])
+        start = time.perf_counter()
+        await handle.control_batch(requests)
+        report.add(prefix + ".control_batch.mean",
+                   (time.perf_counter() - start) / len(requests), "s")
+
+        await latency_measure(report, prefix + ".bulk_in",
+                              lambda: endpoints[0x81].read(512))
+        data = bytes(512)
+        await latency_measure(report, prefix + ".bulk_out",
+                              lambda: endpoints[0x02].write(data))
+        await latency_measure(report, prefix + ".interrupt_in",
+                              lambda: endpoints[0x83].read(64))
+
+        ctx.notifier.close()
+
+@benchmark
+async def interrupt_subscription(report):
+    """
+    Report rate of an interrupt IN subscription on an endpoint always
+    having a report ready.
+    """
+    total = 20000
+    for event_thread in (False, True):
+        name = "subscription.thread" if event_thread else "subscription"
+        ctx, handle, endpoints = device_open(host_create(), event_thread)
+
+        async with endpoints[0x83].subscribe(count = 4, capacity = 1024) as reports:
+            received = 0
+            start = time.perf_counter()
+            while received < total:
+                received += len(await reports.drain())
+            report.add(name + ".interrupt_in", received / (time.perf_counter() - start),
+                       "1/s", higher_is_better = True)
+
+        ctx.notifier.close()
+
+@benchmark
+async def stream_throughput(report):
+    """
+    Bulk streaming over a 40MB/s endpoint with 125us completion
+    latency, for various transfer sizes and queue depths.
+    """
+    total = 4 << 20
+    ctx, handle, endpoints = device_open(host_create(0.000125, 40e6))
+
+    for size in (4096, 65536):
+        for count in (1, 4, 16):
+            async def read():
+                received = 0
+                async with endpoints[0x81].stream(size, count) as stream:
+                    async for data in stream:
+                        received += len(data)
+                        if received >= total:
+                            break
+
+            await throughput_measure(report, "stream.bulk_in.%d.%d" % (size, count),
+                                     read, total)
+
+            chunk = bytes(size)
+            async def write():
+                async with endpoints[0x02].writer(size, count) as writer:
+                    for i in range(total // size):
+                        await writer.write(chunk)
+
+            await throughput_measure(report, "stream.bulk_out.%d.%d" % (size, count),
+                                     write, total)
+
+    ctx.notifier.close()
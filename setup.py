@@ -11,6 +11,6 @@ setup(
         "Development Status :: 4 - Beta",
         "Programming Language :: Python",
     ],
-    packages = find_packages(),
+    packages = find_packages(exclude = ["benchmarks", "benchmarks.*"]),
     install_requires = ["libusb1"],
 )
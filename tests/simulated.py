@@ -0,0 +1,61 @@
+"""
+Test case base running on the simulated backend.
+"""
+
+import asyncio
+import unittest
+import ausb
+from ausb import sim
+
+VENDOR_ID = 0x1234
+PRODUCT_ID = 0x0001
+
+def counter():
+    """
+    Endpoint source returning a 4-byte little-endian sequence number
+    per request.
+    """
+    count = 0
+    def source(length):
+        nonlocal count
+        count += 1
+        return count.to_bytes(4, "little")
+    return source
+
+class SimTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Test case with a context on a simulated host. Host bus 1 gets the
+    device returned by device_create() on port 1, it is opened with its
+    interface 0 claimed, unless device_create() returns None.
+    """
+    EVENT_THREAD = False
+    METRICS = False
+
+    def device_create(self):
+        return None
+
+    async def asyncSetUp(self):
+        self.host = sim.Host()
+        self.contexts = []
+        self.device = self.device_create()
+        self.context = self.context_create()
+        if self.device is None:
+            return
+        self.host.bus(1).attach(1, self.device)
+        self.handle = self.context.device_get(vendor_id = self.device.vendor_id,
+                                              product_id = self.device.product_id).open()
+        self.interface = self.handle.interface_claim(0)
+
+    async def asyncTearDown(self):
+        for context in self.contexts:
+            context.notifier.close()
+            context.context.close()
+
+    def context_create(self):
+        context = ausb.Context(asyncio.get_running_loop(), backend = self.host.USBContext,
+                               event_thread = self.EVENT_THREAD, metrics = self.METRICS)
+        self.contexts.append(context)
+        return context
+
+    def endpoint_open(self, address):
+        return self.interface.open(self.interface.descriptor.endpoint_by_address(address))
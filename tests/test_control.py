@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+import ausb
+from ausb import sim
+from ausb.constant import *
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+GET_STATUS = (RequestTypeType.Standard, RequestTypeRecipient.Device,
+              Request.GetStatus, 0, 0, 2)
+VENDOR_IN = (RequestTypeType.Vendor, RequestTypeRecipient.Device, 0x55, 0, 0, 2)
+
+class ControlBatchTest(SimTestCase):
+    def device_create(self):
+        def handler(request_type, request, value, index, data_or_length):
+            if request != 0x55:
+                raise sim.Stall()
+            return b"ok"
+        return sim.Device(VENDOR_ID, PRODUCT_ID, handler = handler)
+
+    async def test_results(self):
+        requests = [GET_STATUS, VENDOR_IN, GET_STATUS]
+        self.assertEqual(await self.handle.control_batch(requests),
+                         [b"\x00\x00", b"ok", b"\x00\x00"])
+
+    async def test_stall(self):
+        stalled = (RequestTypeType.Vendor, RequestTypeRecipient.Device, 0x56, 0, 0, 2)
+        requests = [GET_STATUS] * 2 + [stalled] + [GET_STATUS] * 4
+        completed = []
+        results = await self.handle.control_batch(
+            requests, depth = 2, completed = lambda i, result: completed.append(i))
+
+        self.assertIsInstance(results[2], ausb.TransferStalled)
+        self.assertEqual([r for i, r in enumerate(results) if i != 2], [b"\x00\x00"] * 6)
+        self.assertEqual(sorted(completed), list(range(7)))
+        self.assertEqual(len(self.handle.transfer_pool), 2)
+
+    async def test_empty(self):
+        self.assertEqual(await self.handle.control_batch([]), [])
+
+    async def test_cancel(self):
+        batch = asyncio.ensure_future(self.handle.control_batch([GET_STATUS] * 500))
+        await asyncio.sleep(0.001)
+        batch.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await batch
+        self.assertEqual(await self.handle.control_batch([GET_STATUS]), [b"\x00\x00"])
+
+    async def test_detach(self):
+        self.host.bus(1).detach(1)
+        results = await self.handle.control_batch([GET_STATUS] * 2)
+        self.assertEqual([type(r) for r in results], [ausb.DeviceError] * 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import struct
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+from ausb import sim
+from ausb.util import fx
+from simulated import SimTestCase
+
+WORDS = (0x12345678, 0x9abcdef0, 0xffffffff, 1)
+
+class ChecksumTest(unittest.TestCase):
+    def test_native(self):
+        blob = memoryview(struct.pack("<4L", *WORDS))
+        self.assertEqual(fx.FirmwareImage._checksum(blob), sum(WORDS))
+
+    @unittest.skipUnless(sys.byteorder == "little", "needs a little-endian host")
+    def test_byteswap(self):
+        # Run big-endian host path: words byteswapped in memory read back
+        # as the little-endian image words.
+        blob = memoryview(struct.pack(">4L", *WORDS))
+        with mock.patch.object(fx, "sys", types.SimpleNamespace(byteorder = "big")):
+            self.assertEqual(fx.FirmwareImage._checksum(blob), sum(WORDS))
+
+class FirmwareLoadAllTest(SimTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        hub = self.host.bus(1).attach(1, sim.Hub(port_count = 6))
+        for port in range(1, 7):
+            hub.attach(port, sim.FxBootloader(firmware = sim.Device(0x04b4, 0x00f1)))
+
+    def image_write(self):
+        """
+        Write a single segment image to a temporary file.
+        """
+        data = bytes(range(256)) * 16
+        words = struct.unpack("<%dL" % (len(data) // 4), data)
+        fd, filename = tempfile.mkstemp(suffix = ".img")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"CY\x1c\xb0")
+            f.write(struct.pack("<LL", len(words), 0x40000000) + data)
+            f.write(struct.pack("<LLL", 0, 0x40000000, sum(words) & 0xffffffff))
+        self.addCleanup(os.unlink, filename)
+        return filename
+
+    async def test_load(self):
+        image = fx.FirmwareImage.from_file(self.image_write())
+        devices = list(self.context.device_filter(vendor_id = 0x04b4, product_id = 0x00f3))
+
+        with mock.patch.object(sim.DeviceHandle, "close", autospec = True) as close, \
+             mock.patch.object(self.context, "invalidate",
+                               wraps = self.context.invalidate) as invalidate:
+            results = await fx.firmware_load_all(self.context, image, devices, per_bus = 6)
+
+        self.assertEqual([r.error for r in results], [None] * 6)
+        self.assertEqual([r.reenumerated.product_id for r in results], [0x00f1] * 6)
+        self.assertEqual(close.call_count, 6)
+        self.assertLessEqual(invalidate.call_count, 2)
+
+    async def test_cached(self):
+        filename = self.image_write()
+        cache = fx.FirmwareCache()
+        with mock.patch.object(fx, "firmware_cache", cache):
+            for i in range(2):
+                devices = list(self.context.device_filter(vendor_id = 0x04b4,
+                                                          product_id = 0x00f3))
+                results = await fx.firmware_load_all(self.context, filename, devices[:1])
+                self.assertIsNone(results[0].error)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from ausb import sim
+from ausb.util import hub
+from ausb.util.hub import Hub, PortStatus
+from simulated import SimTestCase
+
+CONNECTED = PortStatus.CurrentConnection | PortStatus.Enable | PortStatus.Power
+
+class HubTest(SimTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.sim_hub = self.host.bus(1).attach(1, sim.Hub(port_count = 7))
+        self.sim_hub.attach(3, sim.Device(0x1234, 1))
+        self.sim_hub.attach(5, sim.Device(0x1234, 2, speed = sim.usb1.SPEED_LOW))
+        self.hub = await Hub.create(self.context.device_get(vendor_id = 0x1d6b,
+                                                            ports = [1]).open())
+
+    async def monitor_next(self, monitor):
+        return await asyncio.wait_for(monitor.__anext__(), 1)
+
+    async def test_descriptor(self):
+        self.assertEqual(len(self.hub), 7)
+        self.assertEqual(self.hub[2].ports, [1, 3])
+
+    async def test_descriptor_cache(self):
+        again = await Hub.create(self.hub.handle)
+        self.assertIs(again.descriptor, self.hub.descriptor)
+
+        # Same bus, path and address, but not the same hub
+        address = self.sim_hub.address
+        self.host.bus(1).detach(1)
+        self.context.invalidate()
+        self.context.snapshot()
+        self.host.bus(1).attach(1, sim.Hub(port_count = 4)).address = address
+        self.context.invalidate()
+        replaced = await Hub.create(self.context.device_get(vendor_id = 0x1d6b,
+                                                            ports = [1]).open())
+        self.assertEqual(len(replaced), 4)
+
+        self.host.bus(1).detach(1)
+        self.context.invalidate()
+        self.assertEqual(hub._descriptor_cache(self.context), {})
+
+    async def test_ports_status(self):
+        statuses = await self.hub.ports_status()
+        self.assertEqual(len(statuses), 7)
+        self.assertEqual(statuses[0], (PortStatus.Power, 0))
+        self.assertEqual(statuses[2], (CONNECTED | PortStatus.HighSpeed,
+                                       PortStatus.CurrentConnection))
+        self.assertEqual(statuses[4], (CONNECTED | PortStatus.LowSpeed,
+                                       PortStatus.CurrentConnection))
+        self.assertEqual(statuses, [await p.status_get() for p in self.hub])
+
+    async def test_change_clear(self):
+        status, change = await self.hub[2].status_get()
+        await self.hub[2].change_clear(change)
+        self.assertEqual(await self.hub[2].status_get(), (status, 0))
+
+    async def test_monitor(self):
+        monitor = self.hub.monitor()
+        try:
+            changed = {(await self.monitor_next(monitor))[0].index for i in range(2)}
+            self.assertEqual(changed, {3, 5})
+
+            self.sim_hub.attach(1, sim.Device(0x1234, 3))
+            port, status, change = await self.monitor_next(monitor)
+            self.assertEqual(port.index, 1)
+            self.assertTrue(status & PortStatus.CurrentConnection)
+            self.assertEqual(change, PortStatus.CurrentConnection)
+        finally:
+            await monitor.aclose()
+
+    async def test_monitor_polled(self):
+        monitor = self.hub.monitor(interval = 0.01, interrupt = False)
+        try:
+            first = asyncio.ensure_future(self.monitor_next(monitor))
+            await asyncio.sleep(0.03)
+            self.sim_hub.detach(3)
+            port, status, change = await first
+            self.assertEqual(port.index, 3)
+            self.assertFalse(status & PortStatus.CurrentConnection)
+        finally:
+            await monitor.aclose()
+
+if __name__ == "__main__":
+    unittest.main()
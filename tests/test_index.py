@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+from ausb import sim
+from ausb.context import HotplugEvent
+from simulated import SimTestCase
+
+class IndexTest(SimTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.hub = self.host.bus(1).attach(2, sim.Hub(port_count = 7))
+        for port in (1, 2, 3):
+            self.hub.attach(port, sim.Device(0x1234, port, serial = "S%d" % port))
+        self.hub.attach(4, sim.Device(0x1234, 1, serial = "S4"))
+
+    async def test_path(self):
+        d = self.context.device_get(bus = 1, ports = [2, 3])
+        self.assertEqual(d.product_id, 3)
+        self.assertEqual(list(self.context.device_filter(bus = 1, ports = [2, 5])), [])
+
+    async def test_id(self):
+        devices = list(self.context.device_filter(vendor_id = 0x1234, product_id = 1))
+        self.assertEqual(sorted(d.ports[-1] for d in devices), [1, 4])
+        self.assertEqual(self.context.device_get(vendor_id = 0x1234, product_id = 2).ports,
+                         [2, 2])
+
+    async def test_serial(self):
+        self.assertEqual(self.context.device_get(serial = "S4").ports, [2, 4])
+        self.hub.attach(5, sim.Device(0x1234, 5, serial = "S5"))
+        self.context.invalidate()
+        self.assertEqual(self.context.device_get(serial = "S5").ports, [2, 5])
+
+    async def test_update(self):
+        before = {d.key: d for d in self.context.snapshot()}
+        self.hub.detach(1)
+        self.hub.attach(5, sim.Device(0x1234, 5))
+        self.context.invalidate()
+        after = {d.key: d for d in self.context.snapshot()}
+
+        self.assertEqual(len(after), len(before))
+        for key in after.keys() & before.keys():
+            self.assertIs(after[key], before[key])
+        self.assertEqual(list(self.context.device_filter(vendor_id = 0x1234, product_id = 1,
+                                                         ports = [2, 1])), [])
+        self.assertEqual(self.context.device_get(product_id = 5).ports, [2, 5])
+
+    async def test_reenumerated(self):
+        address = self.context.device_get(bus = 1, ports = [2, 1]).address
+        self.hub.attach(1, self.hub.detach(1))
+        self.context.invalidate()
+        after = self.context.device_get(bus = 1, ports = [2, 1])
+        self.assertNotEqual(after.address, address)
+        self.assertEqual(len(self.context.snapshot()), 6)
+
+class HotplugTest(SimTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.context.HOTPLUG_POLL_INTERVAL = 0.01
+        self.context.SNAPSHOT_MAX_AGE = 0.01
+        self.host.bus(1).attach(1, sim.Device(0x1234, 1))
+
+    async def event_get(self, stream):
+        return await asyncio.wait_for(stream.get(), 1)
+
+    async def test_events(self):
+        async with self.context.hotplug() as events:
+            self.host.bus(1).attach(2, sim.Device(0x1234, 2))
+            event = await self.event_get(events)
+            self.assertEqual((event.event, event.device.product_id),
+                             (HotplugEvent.ARRIVED, 2))
+
+            self.host.bus(1).detach(1)
+            event = await self.event_get(events)
+            self.assertEqual((event.event, event.device.product_id), (HotplugEvent.LEFT, 1))
+
+    async def test_enumerate(self):
+        async with self.context.hotplug(vendor_id = 0x1234, enumerate = True) as events:
+            event = await self.event_get(events)
+            self.assertEqual((event.event, event.device.product_id),
+                             (HotplugEvent.ARRIVED, 1))
+
+    async def test_filter(self):
+        async with self.context.hotplug(product_id = 3) as events:
+            self.host.bus(1).attach(2, sim.Device(0x1234, 2))
+            self.host.bus(1).attach(3, sim.Device(0x1234, 3))
+            event = await self.event_get(events)
+            self.assertEqual(event.device.product_id, 3)
+
+    async def test_callback(self):
+        received = []
+        with_callback = self.context.hotplug(callback = received.append)
+        self.host.bus(1).detach(1)
+        await asyncio.sleep(0.05)
+        with_callback.close()
+        self.assertEqual([e.event for e in received], [HotplugEvent.LEFT])
+
+if __name__ == "__main__":
+    unittest.main()
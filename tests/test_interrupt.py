@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+import ausb
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID, counter
+
+class InterruptInSubscriptionTest(SimTestCase):
+    def device_create(self):
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x81, "interrupt", 64, interval = 1, latency = 0.001,
+                         source = counter()),
+        ])
+
+    async def test_order(self):
+        async with self.endpoint_open(0x81).subscribe() as reports:
+            received = [int.from_bytes(await reports.get(), "little") for i in range(5)]
+            received += [int.from_bytes(r, "little") for r in await reports.drain(3)]
+        self.assertEqual(received[:5], [1, 2, 3, 4, 5])
+        self.assertEqual(received[5:], list(range(6, 6 + len(received) - 5)))
+
+    async def test_overrun(self):
+        async with self.endpoint_open(0x81).subscribe(capacity = 4) as reports:
+            await reports.get()
+            await asyncio.sleep(0.05)
+            self.assertEqual(reports.pending, 4)
+            self.assertGreater(reports.overruns, 0)
+            self.assertEqual(reports.received - reports.overruns - 1, reports.pending)
+
+            latest = [int.from_bytes(r, "little") for r in await reports.drain()]
+            self.assertEqual(latest[0], reports.overruns + 2)
+            self.assertEqual(latest, list(range(latest[0], latest[0] + 4)))
+
+    async def test_close(self):
+        reports = self.endpoint_open(0x81).subscribe(count = 3)
+        await reports.get()
+        await reports.close()
+        self.assertEqual(len(self.handle.transfer_pool), 3)
+        with self.assertRaises(ValueError):
+            await reports.get()
+        self.assertEqual([r async for r in reports], [])
+
+    async def test_detach(self):
+        async with self.endpoint_open(0x81).subscribe() as reports:
+            await reports.get()
+            self.host.bus(1).detach(1)
+            with self.assertRaises(ausb.DeviceError):
+                while True:
+                    await reports.drain()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+class IsochronousTest(SimTestCase):
+    def device_create(self):
+        self.packets = []
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x81, "isochronous", 192, interval = 1,
+                         source = lambda length: b"\x01" * (length // 2)),
+            sim.Endpoint(0x02, "isochronous", 192, interval = 1,
+                         sink = self.packets.append),
+        ])
+
+    async def test_in(self):
+        async with self.endpoint_open(0x81).stream(packets = 8, count = 2) as stream:
+            batch = await stream.read()
+        self.assertEqual(len(batch), 8)
+        self.assertEqual(list(batch.lengths), [96] * 8)
+        self.assertEqual(list(batch.status), [0] * 8)
+        self.assertEqual(batch.errors, 0)
+        self.assertEqual(bytes(batch.packet(3)), b"\x01" * 96)
+
+    async def test_out(self):
+        async with self.endpoint_open(0x02).stream(packets = 4, count = 2) as stream:
+            for i in range(3):
+                await stream.write(bytes([i]) * 500)
+        self.assertEqual(stream.bytes_written, 1500)
+        self.assertEqual(stream.packet_errors, 0)
+        self.assertEqual([len(p) for p in self.packets], [192, 192, 116] * 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import unittest
+import ausb
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+class MetricsTest(SimTestCase):
+    METRICS = True
+
+    def device_create(self):
+        self.stall = False
+        def sink(data):
+            if self.stall:
+                raise sim.Stall()
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x02, "bulk", 512, sink = sink),
+        ])
+
+    def device_snapshot(self):
+        key = ausb.snapshot.device_key(self.handle.descriptor.device)
+        return self.context.metrics.snapshot()[ausb.metrics.device_name(key)]
+
+    async def test_snapshot(self):
+        await self.endpoint_open(0x02).write(b"abc")
+        s = self.context.metrics.snapshot()
+        self.assertEqual(json.loads(json.dumps(s)), s)
+
+        ep = self.device_snapshot()["0x02"]
+        self.assertEqual((ep["submitted"], ep["statuses"], ep["bytes"]),
+                         (1, {"completed": 1}, 3))
+        buckets = ep["latency"]["buckets"]
+        self.assertEqual(list(buckets)[0], "0.0001")
+        self.assertEqual(buckets["+Inf"], 1)
+
+    async def test_failed_bytes(self):
+        endpoint = self.endpoint_open(0x02)
+        await endpoint.write(b"abc")
+        self.stall = True
+        with self.assertRaises(ausb.TransferStalled):
+            await endpoint.write(b"defg")
+        ep = self.device_snapshot()["0x02"]
+        self.assertEqual(ep["statuses"], {"completed": 1, "stall": 1})
+        self.assertEqual(ep["bytes"], 3)
+
+    async def test_reopen(self):
+        await self.endpoint_open(0x02).write(b"abc")
+        self.host.bus(1).attach(1, self.host.bus(1).detach(1))
+        self.handle.reopen()
+        self.interface = self.handle.interface_claim(0)
+        await self.endpoint_open(0x02).write(b"defg")
+
+        ep = self.device_snapshot()["0x02"]
+        self.assertEqual((ep["submitted"], ep["bytes"], ep["latency"]["count"]),
+                         (1, 4, 1))
+        self.assertEqual(len(self.context.metrics.snapshot()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+class TransferPoolTest(SimTestCase):
+    def device_create(self):
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x81, "bulk", 512),
+            sim.Endpoint(0x02, "bulk", 512),
+        ])
+
+    async def test_reuse(self):
+        pool = self.handle.transfer_pool
+        endpoint = self.endpoint_open(0x81)
+
+        await endpoint.read(512)
+        self.assertEqual((pool.hits, pool.misses, len(pool)), (0, 1, 1))
+
+        for i in range(10):
+            await endpoint.read(512)
+        self.assertEqual((pool.hits, pool.misses, len(pool)), (10, 1, 1))
+
+    async def test_ready(self):
+        pool = self.handle.transfer_pool
+        await self.endpoint_open(0x81).read(512)
+
+        transfer, ready = pool.acquire(("bulk", 0x81, 512))
+        self.assertTrue(ready)
+        pool.release(transfer)
+
+        transfer, ready = pool.acquire(("bulk", 0x81, 64))
+        self.assertFalse(ready)
+        pool.release(transfer)
+
+    async def test_borrowed(self):
+        pool = self.handle.transfer_pool
+        buffer = bytearray(64)
+        self.assertEqual(await self.endpoint_open(0x81).readinto(buffer), 64)
+
+        transfer, ready = pool.acquire()
+        self.assertFalse(ready)
+        self.assertEqual(len(transfer.getBuffer()), 0)
+
+    async def test_timed(self):
+        pool = self.handle.transfer_pool
+        endpoint = self.endpoint_open(0x02)
+
+        await endpoint.write(b"abc", timeout = 1)
+        await endpoint.write(b"abc", timeout = 1)
+        self.assertEqual((pool.hits, pool.misses, len(pool)), (1, 1, 1))
+
+        transfer, ready = pool.acquire(("bulk", 0x02))
+        self.assertFalse(ready)
+
+    async def test_size(self):
+        pool = self.handle.transfer_pool
+        endpoint = self.endpoint_open(0x81)
+        stream = endpoint.stream(512, count = pool.size + 4)
+        await stream.read()
+        await stream.close()
+        self.assertEqual(len(pool), pool.size)
+
+if __name__ == "__main__":
+    unittest.main()
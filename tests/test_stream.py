@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+import ausb
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID, counter
+
+class BulkInStreamTest(SimTestCase):
+    def device_create(self):
+        self.source = counter()
+        self.calls = 0
+        def source(length):
+            self.calls += 1
+            return self.source(length)
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x81, "bulk", 512, source = source),
+        ])
+
+    async def test_copy(self):
+        async with self.endpoint_open(0x81).stream(512, count = 4) as stream:
+            received = []
+            async for data in stream:
+                self.assertIsInstance(data, bytearray)
+                received.append(int.from_bytes(data, "little"))
+                if len(received) == 20:
+                    break
+        self.assertEqual(received, list(range(1, 21)))
+        self.assertEqual(len(self.handle.transfer_pool), 4)
+
+    async def test_no_copy(self):
+        async with self.endpoint_open(0x81).stream(512, count = 2, copy = False) as stream:
+            received = []
+            for i in range(10):
+                data = await stream.read()
+                self.assertIsInstance(data, memoryview)
+                received.append(int.from_bytes(data, "little"))
+        self.assertEqual(received, list(range(1, 11)))
+        self.assertEqual(len(self.handle.transfer_pool), 2)
+
+    async def test_backlog(self):
+        stream = self.endpoint_open(0x81).stream(512, count = 2, backlog = 2)
+        await asyncio.sleep(0.02)
+        calls = self.calls
+        await asyncio.sleep(0.02)
+        self.assertEqual(self.calls, calls)
+
+        await stream.read()
+        await stream.read()
+        await asyncio.sleep(0.02)
+        self.assertGreater(self.calls, calls)
+        await stream.close()
+
+    async def test_closed(self):
+        stream = self.endpoint_open(0x81).stream(512)
+        await stream.close()
+        with self.assertRaises(ValueError):
+            await stream.read()
+
+    async def test_detach(self):
+        async with self.endpoint_open(0x81).stream(512) as stream:
+            await stream.read()
+            self.host.bus(1).detach(1)
+            with self.assertRaises(ausb.DeviceError):
+                while True:
+                    await stream.read()
+
+class BulkOutWriterTest(SimTestCase):
+    def device_create(self):
+        self.chunks = []
+        self.stall = None
+        def sink(data):
+            if len(self.chunks) == self.stall:
+                raise sim.Stall()
+            self.chunks.append(data)
+        return sim.Device(VENDOR_ID, PRODUCT_ID, endpoints = [
+            sim.Endpoint(0x02, "bulk", 512, latency = 0.001, sink = sink),
+        ])
+
+    async def test_coalesce(self):
+        data = bytes(range(100))
+        async with self.endpoint_open(0x02).writer(1024, count = 2) as writer:
+            for i in range(25):
+                await writer.write(data)
+        self.assertEqual([len(c) for c in self.chunks], [1024, 1024, 452])
+        self.assertEqual(b"".join(self.chunks), data * 25)
+        self.assertEqual(writer.bytes_written, 2500)
+        self.assertEqual(len(self.handle.transfer_pool), 2)
+
+    async def test_flush(self):
+        writer = self.endpoint_open(0x02).writer(1024)
+        await writer.write(b"abc")
+        await writer.drain()
+        await writer.write(b"def")
+        await writer.close()
+        self.assertEqual(self.chunks, [b"abc", b"def"])
+
+    async def test_error(self):
+        self.stall = 1
+        writer = self.endpoint_open(0x02).writer(1024, count = 1, queue = 4)
+        await writer.write(bytes(4096))
+        with self.assertRaises(ausb.TransferStalled):
+            await writer.drain()
+        self.assertEqual(writer.errors[0][:2], (1024, 1024))
+        with self.assertRaises(ausb.TransferStalled):
+            await writer.write(b"x")
+        await writer.abort()
+        self.assertEqual(len(self.chunks), 1)
+
+    async def test_abort(self):
+        with self.assertRaises(RuntimeError):
+            async with self.endpoint_open(0x02).writer(512, count = 2, queue = 16) as writer:
+                await writer.write(bytes(512 * 16))
+                raise RuntimeError()
+        await asyncio.sleep(0.02)
+        self.assertLess(len(self.chunks), 16)
+        self.assertEqual(len(self.handle.transfer_pool), 2)
+        with self.assertRaises(ValueError):
+            await writer.write(b"x")
+
+if __name__ == "__main__":
+    unittest.main()
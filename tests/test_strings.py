@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+from unittest import mock
+from ausb import sim
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+class Device(sim.Device):
+    """
+    Device counting string descriptor requests, languages descriptor
+    may be overridden.
+    """
+    languages = None
+
+    def control(self, request_type, request, value, index, data_or_length):
+        if request_type & 0x60 == 0 and request == 6 and value >> 8 == 3:
+            self.requests += 1
+            if value & 0xff == 0 and self.languages is not None:
+                return self.languages
+        return super().control(request_type, request, value, index, data_or_length)
+
+class StringsTest(SimTestCase):
+    def device_create(self):
+        device = Device(VENDOR_ID, PRODUCT_ID, manufacturer = "Maker", product = "Thing")
+        device.requests = 0
+        return device
+
+    async def test_cache(self):
+        d = self.handle.descriptor
+        indexes = [d.manufacturer_index, d.product_index]
+        strings = await self.handle.strings_get(indexes)
+        self.assertEqual(strings, {indexes[0]: "Maker", indexes[1]: "Thing"})
+        self.assertEqual(self.device.requests, 3)
+
+        self.assertEqual(await d.strings_get(indexes), strings)
+        self.assertEqual(d.manufacturer, "Maker")
+        self.assertEqual(self.device.requests, 3)
+
+    async def test_no_language(self):
+        self.device.languages = b""
+        self.assertEqual(await self.handle.strings_get(), {})
+        self.assertEqual(await self.handle.descriptor.strings_get(), {})
+        self.assertEqual(self.device.requests, 1)
+
+    async def test_cancelled(self):
+        d = self.handle.descriptor
+        async def string_get(index, language):
+            raise asyncio.CancelledError()
+
+        with mock.patch.object(self.handle, "_string_get", string_get):
+            self.assertEqual(await self.handle.strings_get([d.product_index]), {})
+        self.assertEqual(await self.handle.strings_get([d.product_index]),
+                         {d.product_index: "Thing"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+import unittest
+import ausb
+from ausb import sim
+from ausb.constant import *
+from simulated import SimTestCase, VENDOR_ID, PRODUCT_ID
+
+GET_STATUS = (RequestTypeType.Standard, RequestTypeRecipient.Device,
+              Request.GetStatus, 0, 0, 2)
+
+class TimeoutTest(SimTestCase):
+    def device_create(self):
+        return sim.Device(VENDOR_ID, PRODUCT_ID, latency = 0.05, endpoints = [
+            sim.Endpoint(0x81, "bulk", 512, source = lambda length: None),
+            sim.Endpoint(0x02, "bulk", 512),
+        ])
+
+    async def test_expiry(self):
+        start = time.monotonic()
+        with self.assertRaises(ausb.TransferTimeout) as cm:
+            await self.endpoint_open(0x81).read(512, timeout = 0.02)
+        self.assertGreaterEqual(time.monotonic() - start, 0.02)
+        self.assertEqual(cm.exception.length, 0)
+        self.assertEqual(bytes(cm.exception.data), b"")
+
+    async def test_deadline(self):
+        loop = asyncio.get_running_loop()
+        with self.assertRaises(ausb.TransferTimeout) as cm:
+            await self.endpoint_open(0x81).readinto(bytearray(64), deadline = loop.time() + 0.02)
+        self.assertEqual(cm.exception.length, 0)
+
+    async def test_expired(self):
+        loop = asyncio.get_running_loop()
+        pool = self.handle.transfer_pool
+        with self.assertRaises(ausb.TransferTimeout):
+            await self.endpoint_open(0x81).read(512, deadline = loop.time() - 1)
+        self.assertEqual(pool.misses, 0)
+
+    async def test_earliest(self):
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        with self.assertRaises(ausb.TransferTimeout):
+            await self.endpoint_open(0x81).read(512, timeout = 10,
+                                                deadline = loop.time() + 0.02)
+        self.assertLess(time.monotonic() - start, 5)
+
+    async def test_in_time(self):
+        self.assertEqual(await self.endpoint_open(0x02).write(b"abc", timeout = 1), b"abc")
+        self.assertEqual(await self.handle.control(*GET_STATUS, timeout = 1), b"\x00\x00")
+
+    async def test_control(self):
+        with self.assertRaises(ausb.TransferTimeout):
+            await self.handle.control(*GET_STATUS, timeout = 0.01)
+
+    async def test_feature(self):
+        with self.assertRaises(ausb.TransferTimeout):
+            await self.endpoint_open(0x81).clear_feature(0, timeout = 0.01)
+        await self.handle.set_feature(1, timeout = 1)
+
+    async def test_batch_deadline(self):
+        loop = asyncio.get_running_loop()
+        results = await self.handle.control_batch([GET_STATUS] * 6, depth = 1,
+                                                  deadline = loop.time() + 0.12)
+        self.assertEqual(results[0], b"\x00\x00")
+        self.assertIsInstance(results[-1], ausb.TransferTimeout)
+
+class TimeoutThreadTest(TimeoutTest):
+    EVENT_THREAD = True
+
+if __name__ == "__main__":
+    unittest.main()